@@ -0,0 +1,1061 @@
+#!/usr/bin/env python3
+"""
+QQQ-CRAFT LAUNCHER BENCHMARKS
+Заміри продуктивності лаунчера. Результати виводяться у форматі JSON.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import socket
+import tempfile
+import subprocess
+import urllib.request
+import tracemalloc
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from pathlib import Path
+
+import minecraft_launcher_lib
+from minecraft_launcher_lib._helper import download_file
+
+import launcher
+from launcher import (
+    Hasher, PathManager, ModpacksManager, MinecraftLauncher, MirrorSet, TreeSnapshot, Config,
+    DOWNLOAD_RETRIES, PARTIAL_SUFFIX, PRIORITY_FILE_LIMIT, CHECKSUM_ALGORITHMS, INSTALL_STATE_FILE,
+    LAUNCH_CACHE_FILE
+)
+from devserver import StandInServer, SHAPES, generate_modpack, mutate_modpack
+
+MB = 1024 * 1024
+
+
+def write_random_file(path, size):
+    """Створення файлу заданого розміру з випадковим вмістом"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    block = os.urandom(MB)
+    with open(path, 'wb') as f:
+        left = size
+        while left > 0:
+            f.write(block[:min(left, len(block))])
+            left -= len(block)
+
+
+def measure(func, *args):
+    """Час виконання та пікове виділення пам'яті Python"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def make_manager(base_dir, *server_urls):
+    """ModpacksManager з окремою базовою папкою, налаштований на локальні сервери"""
+    manager = ModpacksManager(PathManager(base_dir))
+    manager.mirrors = MirrorSet(server_urls)
+    return manager
+
+
+def closed_port_url():
+    """Адреса, на якій гарантовано ніхто не слухає"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+@contextlib.contextmanager
+def server_process(root, *options):
+    """devserver.py в окремому процесі, щоб сервер не ділив GIL із лаунчером"""
+    script = Path(__file__).resolve().parent / "devserver.py"
+    process = subprocess.Popen(
+        [sys.executable, str(script), str(root), "--port", "0", *options],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    try:
+        line = process.stdout.readline()
+        yield line.split()[-1].split("/?")[0]
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def cpu_seconds():
+    """Процесорний час лаунчера разом з усіма його потоками"""
+    return time.process_time()
+
+
+def legacy_md5(path):
+    """Попередня реалізація: файл читається в пам'ять цілком"""
+    with open(path, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+def bench_hashing(args):
+    """Порівняння хешування цілим файлом і блоками/mmap на 1 MB, 100 MB та 1 GB"""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size_mb in args.sizes:
+            path = Path(tmp) / f"{size_mb}mb.bin"
+            write_random_file(path, size_mb * MB)
+            row = {"size_mb": size_mb}
+            for name, func in (("legacy", legacy_md5), ("chunked", Hasher.file_digest)):
+                digest, elapsed, peak = measure(func, path)
+                row[name] = {
+                    "seconds": round(elapsed, 4),
+                    "mb_per_s": round(size_mb / elapsed, 1) if elapsed else None,
+                    "peak_mb": round(peak / 1024 / 1024, 2),
+                    "digest": digest,
+                }
+            path.unlink()
+            results.append(row)
+    return results
+
+
+def bench_checksums(args):
+    """Швидкість алгоритмів контрольних сум на файлах розміру типових модів (jar)"""
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.checksum_files):
+            path = Path(tmp) / f"mod{i:04d}.jar"
+            write_random_file(path, rng.randint(64 * 1024, 8 * MB))
+            paths.append(path)
+        total = sum(p.stat().st_size for p in paths)
+        # Прогрів кешу сторінок, щоб міряти хешування, а не диск
+        for path in paths:
+            path.read_bytes()
+
+        results = {"files": len(paths), "bytes": total, "algorithms": {}}
+        for algorithm in args.checksum_algorithms:
+            cpu = cpu_seconds()
+            start = time.perf_counter()
+            for path in paths:
+                Hasher.file_digest(path, algorithm)
+            elapsed = time.perf_counter() - start
+            results["algorithms"][algorithm] = {
+                "seconds": round(elapsed, 3),
+                "cpu_seconds": round(cpu_seconds() - cpu, 3),
+                "mb_per_s": round(total / MB / elapsed, 1) if elapsed else None,
+            }
+    return results
+
+
+def bench_resume(args):
+    """Докачування після обривів: перший запуск обривається на кожній спробі,
+    другий має докачати лише відсутній хвіст файлу"""
+    size = args.resume_mb * MB
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        source = tmp / "modpacks" / "resume" / "mods" / "big.jar"
+        write_random_file(source, size)
+        expected = Hasher.file_digest(source)
+
+        server = StandInServer(tmp / "modpacks", drop_after=size // (DOWNLOAD_RETRIES * 2),
+                               drop_count=DOWNLOAD_RETRIES).start()
+        try:
+            manager = make_manager(tmp / "client", server.url)
+            instance = tmp / "client" / "instances" / "resume"
+            local = instance / "mods" / "big.jar"
+            obj = manager.store.object_path(expected)
+            part = obj.with_name(obj.name + PARTIAL_SUFFIX)
+
+            manager.install_modpack("resume", instance)
+            partial = part.stat().st_size if part.exists() else 0
+            sent_first = server.stats["bytes_sent"]
+
+            start = time.perf_counter()
+            manager.install_modpack("resume", instance)
+            elapsed = time.perf_counter() - start
+            sent_second = server.stats["bytes_sent"] - sent_first
+        finally:
+            server.stop()
+
+        return {
+            "size_mb": args.resume_mb,
+            "drops": server.stats.get("drops", 0),
+            "partial_after_first_launch": partial,
+            "bytes_sent_second_launch": sent_second,
+            "missing_tail": size - partial,
+            "retransferred_bytes": server.stats["bytes_sent"] - size,
+            "resume_seconds": round(elapsed, 3),
+            "checksum_ok": local.exists() and Hasher.file_digest(local) == expected,
+        }
+
+
+def bench_bundles(args):
+    """Холодна синхронізація синтетичного модпака з дрібних файлів
+    поодинці та архівами"""
+    results = {"files": args.bundle_files}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        rng = random.Random(1)
+        for i in range(args.bundle_files):
+            path = tmp / "modpacks" / "small" / "config" / f"dir{i % 100}" / f"file{i}.json"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(os.urandom(rng.randint(200, 8 * 1024)))
+
+        for mode, bundles in (("single", False), ("bundled", True)):
+            server = StandInServer(tmp / "modpacks", bundles=bundles).start()
+            try:
+                manager = make_manager(tmp / mode, server.url)
+                start = time.perf_counter()
+                manager.install_modpack("small", tmp / mode / "instances" / "small")
+                elapsed = time.perf_counter() - start
+            finally:
+                server.stop()
+            results[mode] = {
+                "seconds": round(elapsed, 3),
+                "requests": server.stats["requests"],
+                "bytes_sent": server.stats["bytes_sent"],
+            }
+    results["requests_saved"] = results["single"]["requests"] - results["bundled"]["requests"]
+    return results
+
+
+def bench_snapshot(args):
+    """Обхід дерева інстансу: rglob для кожної папки проти одного знімка"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        for i in range(args.snapshot_files):
+            parts = [f"d{(i >> (3 * level)) % 8}" for level in range(args.snapshot_depth)]
+            path = root.joinpath(*parts, f"f{i}.txt")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"x" * (i % 512))
+
+        start = time.perf_counter()
+        dirs = [d for d in root.rglob('*') if d.is_dir()]
+        legacy_sizes = {d: sum(f.stat().st_size for f in d.rglob('*') if f.is_file()) for d in dirs}
+        legacy_files = sum(1 for f in root.rglob('*') if f.is_file())
+        legacy = time.perf_counter() - start
+
+        start = time.perf_counter()
+        snapshot = TreeSnapshot(root)
+        elapsed = time.perf_counter() - start
+
+        return {
+            "files": legacy_files,
+            "dirs": len(legacy_sizes),
+            "depth": args.snapshot_depth,
+            "rglob_per_dir_seconds": round(legacy, 3),
+            "snapshot_seconds": round(elapsed, 3),
+            "sizes_match": all(snapshot.dir_size(str(d.relative_to(root)).replace('\\', '/')) == size
+                               for d, size in legacy_sizes.items()),
+        }
+
+
+def bench_cleanup(args):
+    """Пошук зайвих файлів: перебір усіх синхронізованих шляхів проти індексу папок"""
+    rng = random.Random(1)
+    server_files = {}
+    for i in range(args.manifest_files):
+        folder = rng.choice(["mods", "config", "config/sub", "resourcepacks", "shaderpacks", "kubejs/scripts"])
+        server_files[f"{folder}/file{i}"] = {"sync": True}
+    local_paths = list(server_files)
+    while len(local_paths) < args.local_files:
+        i = len(local_paths)
+        folder = rng.choice(["screenshots", "logs", "saves/world/region", "config", "mods", ""])
+        local_paths.append(f"{folder}/user{i}" if folder else f"user{i}")
+
+    manager = ModpacksManager.__new__(ModpacksManager)
+    start = time.perf_counter()
+    orphans = manager.find_orphans(local_paths, server_files)
+    indexed = time.perf_counter() - start
+
+    # Старий алгоритм на вибірці — повний прогін тривав би хвилини
+    sample = [p for p in local_paths if p not in server_files][:args.cleanup_sample]
+    sync_files = set(server_files)
+    start = time.perf_counter()
+    for rel_path in sample:
+        parent_dir = '/'.join(rel_path.split('/')[:-1])
+        any(sync_file.startswith(parent_dir) for sync_file in sync_files)
+    legacy = (time.perf_counter() - start) / max(len(sample), 1) * (len(local_paths) - len(server_files))
+
+    return {
+        "local_files": len(local_paths),
+        "manifest_files": len(server_files),
+        "orphans": len(orphans),
+        "indexed_seconds": round(indexed, 4),
+        "legacy_estimated_seconds": round(legacy, 2),
+    }
+
+
+def bench_scheduler(args):
+    """Фіксований пул із 10 потоків у порядку маніфесту проти адаптивного планувальника
+    на модпаку, де найбільший файл стоїть останнім"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        root = tmp / "modpacks" / "mixed"
+        for i in range(300):
+            write_random_file(root / "config" / f"a{i:03}.cfg", 4096)
+        for i in range(20):
+            write_random_file(root / "mods" / f"m{i:02}.jar", MB)
+        write_random_file(root / "mods" / "zz_big.jar", args.big_mb * MB)
+
+        modes = {
+            "fixed": {"initial_workers": 10, "min_workers": 10, "max_workers": 10, "largest_first": False},
+            "adaptive": {},
+        }
+        for mode, options in modes.items():
+            server = StandInServer(tmp / "modpacks", bandwidth=args.bandwidth_mb * MB,
+                                   connection_bandwidth=args.connection_mb * MB, latency=0.02).start()
+            try:
+                manager = make_manager(tmp / mode, server.url)
+                manager.scheduler_options.update(options)
+                decisions = []
+                callback = lambda p, f, status, message=None: status == 'scheduler' and decisions.append(message)
+                start = time.perf_counter()
+                manager.install_modpack("mixed", tmp / mode / "instances" / "mixed", callback)
+                elapsed = time.perf_counter() - start
+            finally:
+                server.stop()
+            results[mode] = {
+                "seconds": round(elapsed, 3),
+                "max_workers_used": max((d["workers"] for d in decisions), default=None),
+                "decisions": decisions,
+            }
+    return results
+
+
+def bench_engines(args):
+    """Потоковий планувальник проти asyncio-рушія на модпаку з дрібних файлів;
+    сервер працює в окремому процесі"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        root = tmp / "modpacks" / "tiny"
+        for i in range(args.engine_files):
+            write_random_file(root / f"d{i % 100:02}" / f"f{i:05}.txt", random.randint(200, 4096))
+
+        with server_process(tmp / "modpacks") as url:
+            for engine in ("threads", "asyncio"):
+                manager = make_manager(tmp / engine, url)
+                manager.engine = engine
+                cpu = cpu_seconds()
+                start = time.perf_counter()
+                ok = manager.install_modpack("tiny", tmp / engine / "instances" / "tiny").ok
+                elapsed = time.perf_counter() - start
+                cpu = cpu_seconds() - cpu
+                results[engine] = {
+                    "ok": ok,
+                    "seconds": round(elapsed, 3),
+                    "cpu_seconds": round(cpu, 3),
+                    "files_per_second": round(args.engine_files / elapsed, 1),
+                }
+    return results
+
+
+def bench_limiter(args):
+    """Точність ліміту швидкості та час появи дрібних файлів з пріоритетною смугою і без неї"""
+    results = {}
+    limit = args.limit_mbit * 125000
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        root = tmp / "modpacks" / "capped"
+        for i in range(4):
+            write_random_file(root / "mods" / f"big{i}.jar", args.limit_mbit * 125000 * 2)
+        # Дрібні файли розміром з блок читання, щоб без пріоритету вони чекали нарівні з jar
+        for i in range(10):
+            write_random_file(root / "config" / f"c{i:02}.toml", PRIORITY_FILE_LIMIT)
+        total = sum(f.stat().st_size for f in root.rglob("*") if f.is_file())
+
+        with server_process(tmp / "modpacks") as url:
+            for lane, priority_limit in (("priority", None), ("no_priority", 0)):
+                manager = make_manager(tmp / lane, url)
+                manager.limiter.configure(limit)
+                if priority_limit is not None:
+                    manager.priority_limit = priority_limit
+                small_done = []
+                start = time.perf_counter()
+                finish_file = manager.finish_file
+
+                def track(path, info):
+                    finish_file(path, info)
+                    if path.startswith("config/"):
+                        small_done.append(time.perf_counter() - start)
+
+                manager.finish_file = track
+                manager.install_modpack("capped", tmp / lane / "instances" / "capped")
+                elapsed = time.perf_counter() - start
+                rate = manager.transferred / elapsed
+                results[lane] = {
+                    "limit_bytes_per_second": limit,
+                    "measured_bytes_per_second": round(rate),
+                    "deviation_percent": round((rate - limit) / limit * 100, 2),
+                    "bytes": total,
+                    "seconds": round(elapsed, 3),
+                    "small_files_done_after": round(max(small_done, default=0), 3),
+                }
+    return results
+
+
+def bench_mirrors(args):
+    """Синхронізація з одного нестабільного сервера проти набору дзеркал, серед яких
+    є вимкнене, «лежаче», повільне, нестабільне та справне"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        root = tmp / "modpacks" / "mirrored"
+        for i in range(args.mirror_files):
+            write_random_file(root / "mods" / f"m{i:03}.jar", 256 * 1024)
+
+        servers = {
+            "unavailable": StandInServer(tmp / "modpacks", unavailable=True),
+            "slow": StandInServer(tmp / "modpacks", latency=0.3),
+            "flaky": StandInServer(tmp / "modpacks", error_rate=args.error_rate),
+            "healthy": StandInServer(tmp / "modpacks", latency=0.01),
+        }
+        names = {server.url: name for name, server in servers.items()}
+        names[closed_port_url()] = "closed"
+        for server in servers.values():
+            server.start()
+        try:
+            scenarios = {
+                "flaky_only": [servers["flaky"].url],
+                "mirrors": list(names),
+            }
+            for scenario, urls in scenarios.items():
+                manager = make_manager(tmp / scenario, *urls)
+                start = time.perf_counter()
+                if len(urls) > 1:
+                    manager.mirrors.probe(manager.session)
+                probed = time.perf_counter() - start
+                ok = manager.install_modpack("mirrored", tmp / scenario / "instances" / "mirrored").ok
+                results[scenario] = {
+                    "ok": ok,
+                    "seconds": round(time.perf_counter() - start, 3),
+                    "probe_seconds": round(probed, 3),
+                    "order": [names[url] for url in manager.mirrors.ordered()],
+                    "requests": {name: server.stats.get("requests", 0) for name, server in servers.items()},
+                    "errors": {name: server.stats.get("errors", 0) for name, server in servers.items()},
+                }
+                for server in servers.values():
+                    server.stats = {"requests": 0, "bytes_sent": 0}
+        finally:
+            for server in servers.values():
+                server.stop()
+    return results
+
+
+def bench_progress(args):
+    """Кількість і частота подій прогресу на модпаку з великим jar та тисячами дрібних файлів"""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        root = tmp / "modpacks" / "progress"
+        write_random_file(root / "mods" / "huge.jar", args.big_mb * MB)
+        for i in range(args.progress_files):
+            write_random_file(root / "config" / f"c{i:04}.cfg", 2048)
+
+        events = []
+        with server_process(tmp / "modpacks", "--bandwidth", str(args.bandwidth_mb * MB)) as url:
+            manager = make_manager(tmp / "client", url)
+            start = time.perf_counter()
+            manager.install_modpack(
+                "progress", tmp / "client" / "instances" / "progress",
+                lambda percent, path, status, message=None: events.append((time.perf_counter(), status, percent))
+            )
+            elapsed = time.perf_counter() - start
+
+    ticks = [(t, percent) for t, status, percent in events if status == 'progress']
+    gaps = [b[0] - a[0] for a, b in zip(ticks, ticks[1:])]
+    return {
+        "files": args.progress_files + 1,
+        "seconds": round(elapsed, 3),
+        "callbacks": len(events),
+        "progress_events": len(ticks),
+        "events_per_second": round(len(ticks) / elapsed, 1),
+        "max_gap_seconds": round(max(gaps, default=0), 3),
+        "distinct_percent_values": len({int(percent) for _, percent in ticks}),
+        "monotonic": all(a[1] <= b[1] for a, b in zip(ticks, ticks[1:])),
+    }
+
+
+def bench_failures(args):
+    """Синхронізація з файлами, що зникли з сервера, і нестабільними відповідями:
+    збір помилок у звіт проти модального діалогу, що тримає потік до натискання OK"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        root = tmp / "modpacks" / "broken"
+        for i in range(args.failure_files):
+            write_random_file(root / "mods" / f"m{i:04}.jar", 64 * 1024)
+
+        with server_process(tmp / "modpacks", "--missing-rate", "0.05", "--error-rate", "0.1") as url:
+            for mode in ("modal", "collected"):
+                manager = make_manager(tmp / mode, url)
+                manager.scheduler_options.update(initial_workers=10, min_workers=10, max_workers=10)
+                if mode == "modal":
+                    # Попередня поведінка: кожна помилка блокує потік, поки гравець не закриє діалог
+                    record_failure = manager.record_failure
+
+                    def record_failure_modal(path, info, error):
+                        time.sleep(args.dialog_seconds)
+                        record_failure(path, info, error)
+
+                    manager.record_failure = record_failure_modal
+                start = time.perf_counter()
+                report = manager.install_modpack("broken", tmp / mode / "instances" / "broken")
+                elapsed = time.perf_counter() - start
+                results[mode] = {
+                    "seconds": round(elapsed, 3),
+                    "files_per_second": round(args.failure_files / elapsed, 1),
+                    "failures": len(report.failures),
+                    "sample": [asdict(f) for f in report.failures[:2]],
+                }
+    return results
+
+
+def bench_plan(args):
+    """Оцінка плану проти фактичного часу синхронізації; план виконується без повторного
+    планування. Перша синхронізація вимірює швидкість, друга — після зміни частини файлів"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        root = tmp / "modpacks" / "planned"
+        for i in range(40):
+            write_random_file(root / "mods" / f"m{i:02}.jar", MB)
+
+        with server_process(tmp / "modpacks", "--bandwidth", str(args.bandwidth_mb * MB)) as url:
+            manager = make_manager(tmp / "client", url)
+            instance = tmp / "client" / "instances" / "planned"
+            for run in ("cold", "changed"):
+                if run == "changed":
+                    for i in range(0, 40, 4):
+                        write_random_file(root / "mods" / f"m{i:02}.jar", MB)
+                    (instance / "mods" / "stale.jar").write_bytes(b"old")
+                start = time.perf_counter()
+                plan = manager.prepare_plan("planned", instance)
+                planned = time.perf_counter() - start
+                summary = plan.summary()
+                start = time.perf_counter()
+                report = manager.install_modpack("planned", instance)
+                elapsed = time.perf_counter() - start
+                results[run] = {
+                    "plan": summary,
+                    "plan_seconds": round(planned, 3),
+                    "sync_seconds": round(elapsed, 3),
+                    "ok": report.ok,
+                    "plan_reused": "planned" not in manager.plans,
+                }
+    return results
+
+
+def bench_pipeline(args):
+    """Час до першого завантаженого байта на частково застарілому інстансі без індексу:
+    перевірка й завантаження в спільних потоках проти конвеєра зі стадіями"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        root = tmp / "modpacks" / "stale"
+        for i in range(args.pipeline_files):
+            write_random_file(root / "mods" / f"m{i:03}.jar", 4 * MB)
+
+        with server_process(tmp / "modpacks", "--bandwidth", str(args.bandwidth_mb * MB)) as url:
+            managers = {}
+            for mode in ("shared", "pipeline"):
+                managers[mode] = make_manager(tmp / mode, url)
+                managers[mode].install_modpack("stale", tmp / mode / "instances" / "stale")
+            # На сервері з'явились нові моди й змінилась частина старих, а в гравця зник індекс
+            # Змінені моди — останні за порядком перевірки, тож їх знаходять наприкінці
+            for i in range(args.pipeline_stale):
+                write_random_file(root / "mods" / f"new{i:03}.jar", MB)
+                write_random_file(root / "mods" / f"m{args.pipeline_files - 1 - i:03}.jar", 4 * MB)
+
+            for mode, manager in managers.items():
+                instance = tmp / mode / "instances" / "stale"
+                manager.path_manager.get_index_path("stale").unlink()
+                if mode == "shared":
+                    # Як раніше: кожен потік і хешує, і качає зі спільної черги
+                    manager.run_pipeline = lambda fetch, verify, callback: manager.run_scheduled(
+                        [(info["size"], manager.download, path, info)
+                         for path, info in {**fetch, **verify}.items()], callback)
+
+                # План будуємо заздалегідь: міряємо саму синхронізацію
+                manager.prepare_plan("stale", instance)
+                first_byte = []
+                received = manager.transferred
+                start = time.perf_counter()
+
+                def watch():
+                    while not first_byte:
+                        if manager.transferred > received:
+                            first_byte.append(time.perf_counter() - start)
+                        time.sleep(0.005)
+
+                watcher = threading.Thread(target=watch, daemon=True)
+                watcher.start()
+                report = manager.install_modpack("stale", instance)
+                elapsed = time.perf_counter() - start
+                first_byte.append(None)
+                results[mode] = {
+                    "first_byte_seconds": round(first_byte[0], 3) if first_byte[0] is not None else None,
+                    "sync_seconds": round(elapsed, 3),
+                    "received_mb": round((manager.transferred - received) / MB, 1),
+                    "ok": report.ok,
+                    "matches_server": tree_digest(instance) == tree_digest(root),
+                }
+    return results
+
+
+def fake_vanilla(root, url, libraries, assets):
+    """Ванільна версія на локальному сервері: бібліотеки в розкладці maven,
+    об'єкти ресурсів за sha1 і version JSON з посиланнями на них"""
+    rng = random.Random(0)
+    public = f"{url}/public/vanilla"
+    data = {"id": "bench", "assets": "bench", "libraries": []}
+    for i in range(libraries):
+        path = f"bench/lib{i:03}/1.0/lib{i:03}-1.0.jar"
+        write_random_file(root / "libraries" / path, rng.randint(100 * 1024, 2 * MB))
+        data["libraries"].append({
+            "name": f"bench:lib{i:03}:1.0",
+            "url": f"{public}/libraries",
+            "downloads": {"artifact": {
+                "path": path, "url": f"{public}/libraries/{path}",
+                "sha1": Hasher.file_digest(root / "libraries" / path, "sha1"),
+                "size": (root / "libraries" / path).stat().st_size,
+            }},
+        })
+    objects = {}
+    for i in range(assets):
+        content = rng.randbytes(rng.randint(1024, 64 * 1024))
+        digest = hashlib.sha1(content).hexdigest()
+        (root / "objects" / digest[:2]).mkdir(parents=True, exist_ok=True)
+        (root / "objects" / digest[:2] / digest).write_bytes(content)
+        objects[f"minecraft/bench/{i}"] = {"hash": digest, "size": len(content)}
+    index = json.dumps({"objects": objects}).encode()
+    (root / "indexes").mkdir(parents=True, exist_ok=True)
+    (root / "indexes" / "bench.json").write_bytes(index)
+    data["assetIndex"] = {"id": "bench", "url": f"{public}/indexes/bench.json",
+                          "sha1": hashlib.sha1(index).hexdigest(), "size": len(index)}
+    return data
+
+
+def library_install(data, path, objects_url):
+    """Те, що робить minecraft_launcher_lib: install_libraries і цикл install_assets,
+    де адреса об'єктів замінена на локальний сервер"""
+    minecraft_launcher_lib.install.install_libraries(data["id"], data["libraries"], str(path), {})
+    index_path = path / "assets" / "indexes" / f"{data['assets']}.json"
+    download_file(data["assetIndex"]["url"], str(index_path), sha1=data["assetIndex"]["sha1"])
+    with open(index_path) as f:
+        assets = set(obj["hash"] for obj in json.load(f)["objects"].values())
+    session = minecraft_launcher_lib._helper.requests.session()
+    with ThreadPoolExecutor() as executor:
+        futures = [executor.submit(
+            download_file, f"{objects_url}/{digest[:2]}/{digest}",
+            str(path / "assets" / "objects" / digest[:2] / digest), sha1=digest, session=session,
+            minecraft_directory=str(path)
+        ) for digest in assets]
+        for future in futures:
+            future.result()
+
+
+def bench_vanilla(args):
+    """Встановлення ванільних бібліотек і ресурсів: minecraft_launcher_lib проти
+    паралельного попереднього завантаження лаунчера, з нуля та повторно"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        root = tmp / "modpacks" / "vanilla"
+        with server_process(tmp / "modpacks", "--latency", str(args.vanilla_latency)) as url:
+            data = fake_vanilla(root, url, args.vanilla_libraries, args.vanilla_assets)
+            objects_url = f"{url}/public/vanilla/objects"
+            results["files"] = args.vanilla_libraries + args.vanilla_assets
+
+            target = tmp / "library"
+            for run in ("cold", "warm"):
+                start = time.perf_counter()
+                library_install(data, target, objects_url)
+                results.setdefault("library", {})[run] = round(time.perf_counter() - start, 3)
+
+            manager = make_manager(tmp / "client", url)
+            manager.assets_url = objects_url
+            target = tmp / "client" / "instances" / "vanilla"
+            version_json = target / "versions" / "bench" / "bench.json"
+            version_json.parent.mkdir(parents=True)
+            version_json.write_text(json.dumps(data))
+            for run in ("cold", "warm"):
+                start = time.perf_counter()
+                errors = manager.prefetch_vanilla("bench", target)
+                results.setdefault("prefetch", {})[run] = round(time.perf_counter() - start, 3)
+                results["prefetch"][f"{run}_errors"] = errors
+            # Після попереднього завантаження бібліотеці лишається тільки перевірка
+            start = time.perf_counter()
+            library_install(data, target, objects_url)
+            results["prefetch"]["library_after"] = round(time.perf_counter() - start, 3)
+            results["prefetch"]["matches_library"] = tree_digest(target / "assets") == tree_digest(tmp / "library" / "assets")
+    return results
+
+
+def fake_metadata(root, url, data, versions):
+    """Маніфест версій Mojang, maven-metadata Forge, список лоадерів Fabric розміром,
+    близьким до справжніх, та профіль Fabric для версії bench, що веде на fake_vanilla"""
+    root.mkdir(parents=True, exist_ok=True)
+    public = f"{url}/public/meta"
+    version_json = json.dumps(data).encode()
+    (root / "bench.json").write_bytes(version_json)
+    entries = [{"id": "bench", "type": "release", "url": f"{public}/bench.json",
+                "sha1": hashlib.sha1(version_json).hexdigest()}]
+    entries += [{"id": f"1.{i // 10}.{i % 10}", "type": "release",
+                 "url": f"{public}/missing/{i}.json", "sha1": "0" * 40} for i in range(versions)]
+    (root / "version_manifest_v2.json").write_text(json.dumps({"versions": entries}))
+    (root / "loader.json").write_text(json.dumps(
+        [{"version": f"0.{i}.0", "stable": True} for i in range(versions, 0, -1)]))
+    profile = root / "fabric" / "bench" / f"0.{versions}.0.json"
+    profile.parent.mkdir(parents=True, exist_ok=True)
+    profile.write_text(json.dumps({
+        "id": f"fabric-loader-0.{versions}.0-bench", "inheritsFrom": "bench", "type": "release",
+        "mainClass": "net.fabricmc.loader.impl.launch.knot.KnotClient", "libraries": [],
+    }))
+    maven = "".join(f"<version>1.{i // 10}.{i % 10}-{j}.0.0</version>"
+                    for i in range(versions) for j in range(5))
+    (root / "maven-metadata.xml").write_text(
+        f"<metadata><versioning><versions><version>bench-1.0.0</version>{maven}</versions></versioning></metadata>")
+    return {
+        "VERSION_MANIFEST_URL": f"{public}/version_manifest_v2.json",
+        "FABRIC_LOADERS_URL": f"{public}/loader.json",
+        "FABRIC_PROFILE_URL": f"{public}/fabric/{{version}}/{{loader_version}}.json",
+        "FORGE_MAVEN_METADATA_URL": f"{public}/maven-metadata.xml",
+    }
+
+
+@contextlib.contextmanager
+def patched(module, **values):
+    """Тимчасова заміна глобальних змінних модуля"""
+    saved = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+def start_install(manager, target):
+    """Початок встановлення лоадерів до першого байта ванільних файлів:
+    визначення версій Fabric і Forge, профіль Fabric та маніфест Mojang"""
+    received = manager.transferred
+    start = time.perf_counter()
+    first_byte = []
+
+    def watch():
+        while not first_byte:
+            if manager.transferred > received:
+                first_byte.append(time.perf_counter() - start)
+            time.sleep(0.002)
+
+    versions = {loader: manager.resolve_loader_version(loader, "bench") for loader in ("fabric", "forge")}
+    resolved = time.perf_counter() - start
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    errors = manager.prefetch_vanilla(f"fabric-loader-{versions['fabric']}-bench", target)
+    first_byte.append(None)
+    return {
+        "resolve_seconds": round(resolved, 3),
+        "first_byte_seconds": round(first_byte[0], 3) if first_byte[0] is not None else None,
+        "errors": errors,
+        "versions": versions,
+    }
+
+
+def expire_metadata(manager):
+    """Зістарити всі записи кешу метаданих, не чіпаючи їхніх ETag"""
+    for path in manager.path_manager.get_metadata_dir().glob("*.json"):
+        entry = json.loads(path.read_text())
+        entry["fetched"] = 0
+        path.write_text(json.dumps(entry))
+
+
+def bench_metadata(args):
+    """Час до першого завантаження при встановленні лоадера з холодним, теплим
+    і простроченим кешем метаданих, а також робота без мережі"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        with server_process(tmp / "modpacks", "--latency", str(args.metadata_latency)) as url:
+            data = fake_vanilla(tmp / "modpacks" / "vanilla", url, 10, 100)
+            urls = fake_metadata(tmp / "modpacks" / "meta", url, data, args.metadata_versions)
+            with patched(launcher, **urls):
+                for run in ("cold", "warm", "stale"):
+                    # Новий менеджер на кожен запуск, як після перезапуску лаунчера
+                    manager = make_manager(tmp / "client", url)
+                    manager.assets_url = f"{url}/public/vanilla/objects"
+                    if run == "stale":
+                        expire_metadata(manager)
+                    before = server_stats(url)
+                    results[run] = start_install(manager, tmp / "runtime" / run)
+                    after = server_stats(url)
+                    for key in ("requests", "not_modified"):
+                        results[run][key] = after.get(key, 0) - before.get(key, 0)
+
+        with patched(launcher, **urls):
+            manager = make_manager(tmp / "client", url)
+            expire_metadata(manager)
+            start = time.perf_counter()
+            versions = {loader: manager.resolve_loader_version(loader, "bench") for loader in ("fabric", "forge")}
+            results["offline"] = {
+                "resolve_seconds": round(time.perf_counter() - start, 3),
+                "found_version": manager.find_version("bench") is not None,
+                "found_fabric_profile": manager.load_version_json(
+                    f"fabric-loader-{versions['fabric']}-bench", tmp / "runtime" / "offline") is not None,
+                "matches_online": versions == results["cold"]["versions"],
+            }
+    return results
+
+
+def fake_loader_install(runtime, instance, libraries):
+    """Ванільна версія з бібліотеками й аргументами сучасного формату та версія
+    лоадера, що успадковується від неї, як після install_loader"""
+    rule = [{"action": "allow", "features": {"has_custom_resolution": True}}]
+    vanilla = {
+        "id": "bench", "type": "release", "assets": "bench", "mainClass": "net.minecraft.client.main.Main",
+        "libraries": [{"name": f"bench:lib{i:03}:1.0"} for i in range(libraries)],
+        "arguments": {
+            "jvm": ["-Djava.library.path=${natives_directory}", "-cp", "${classpath}"],
+            "game": ["--username", "${auth_player_name}", "--version", "${version_name}",
+                     "--gameDir", "${game_directory}", "--assetsDir", "${assets_root}",
+                     "--assetIndex", "${assets_index_name}", "--uuid", "${auth_uuid}",
+                     "--accessToken", "${auth_access_token}", "--userType", "${user_type}",
+                     {"rules": rule, "value": ["--width", "${resolution_width}", "--height", "${resolution_height}"]}],
+        },
+    }
+    loader = {
+        "id": "bench-loader", "inheritsFrom": "bench", "type": "release",
+        "mainClass": "net.fabricmc.loader.impl.launch.knot.KnotClient",
+        "libraries": [{"name": f"loader:lib{i:03}:1.0"} for i in range(libraries // 5)],
+        "arguments": {"jvm": ["-DFabricMcEmu= net.minecraft.client.main.Main "], "game": []},
+    }
+    for data in (vanilla, loader):
+        path = runtime / "versions" / data["id"] / f"{data['id']}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(data))
+    instance.mkdir(parents=True, exist_ok=True)
+    (instance / INSTALL_STATE_FILE).write_text(json.dumps({"loader": "vanilla", "version_id": "bench-loader"}))
+
+
+def bench_launch(args):
+    """Час від натискання «Грати» до Popen: команда щоразу з version JSON
+    проти кешованої команди з підставленими ім'ям, UUID і роздільністю"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path_manager = PathManager(Path(tmp))
+        instance = path_manager.get_install_dir("bench-loader")
+        fake_loader_install(path_manager.get_runtime_dir(), instance, args.launch_libraries)
+        game = MinecraftLauncher(path_manager)
+        commands = []
+        real_popen = subprocess.Popen
+
+        def popen(command, **kwargs):
+            # Сама бібліотека теж запускає процеси (platform.architecture), їх не чіпаємо
+            if kwargs.get("cwd") != str(instance):
+                return real_popen(command, **kwargs)
+            commands.append(command)
+
+        with patched(launcher.subprocess, Popen=popen):
+            for run in ("built", "cached"):
+                times = []
+                for i in range(args.launch_runs):
+                    if run == "built":
+                        (instance / LAUNCH_CACHE_FILE).unlink(missing_ok=True)
+                    config = Config(nickname=f"player{i}", loader="bench-loader", window_size=f"{1280 + i}x720")
+                    start = time.perf_counter()
+                    game.launch(config)
+                    times.append(time.perf_counter() - start)
+                times.sort()
+                results[run] = {
+                    "median_ms": round(times[len(times) // 2] * 1000, 2),
+                    "max_ms": round(times[-1] * 1000, 2),
+                }
+        # Кешована команда для кожного гравця має збігатися зі зібраною з нуля
+        results["commands_match"] = commands[:args.launch_runs] == commands[args.launch_runs:]
+    return results
+
+
+def server_stats(url):
+    """Лічильники сервера, запущеного в окремому процесі"""
+    with urllib.request.urlopen(f"{url}/stats") as r:
+        return json.load(r)
+
+
+def tree_digest(root):
+    """Шляхи та вміст усіх файлів дерева одним хешем"""
+    md5 = hashlib.md5()
+    for path in sorted(p for p in Path(root).rglob("*") if p.is_file()):
+        md5.update(path.relative_to(root).as_posix().encode())
+        md5.update(Hasher.file_digest(path).encode())
+    return md5.hexdigest()
+
+
+def bench_sync(args):
+    """Наскрізна синхронізація синтетичних модпаків: холодна, повторна без змін
+    і після часткової зміни на сервері"""
+    options = ["--latency", str(args.sync_latency), "--error-rate", str(args.sync_error_rate),
+               "--checksum-algorithm", args.sync_checksum_algorithm]
+    if args.sync_bandwidth_mb:
+        options += ["--bandwidth", str(args.sync_bandwidth_mb * MB)]
+
+    results = {}
+    for shape in args.shapes:
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            modpack = generate_modpack(tmp / "modpacks" / shape, shape, args.scale)
+            files = [p for p in modpack.rglob("*") if p.is_file()]
+            result = {"files": len(files), "bytes": sum(p.stat().st_size for p in files)}
+
+            with server_process(tmp / "modpacks", *options) as url:
+                manager = make_manager(tmp / "client", url)
+                manager.engine = args.engine
+                instance = tmp / "client" / "instances" / shape
+
+                for run in ("cold", "warm", "partial"):
+                    if run == "partial":
+                        result["changes"] = mutate_modpack(modpack, args.change_fraction)
+                    before, cpu = server_stats(url), cpu_seconds()
+                    start = time.perf_counter()
+                    report = manager.install_modpack(shape, instance)
+                    elapsed = time.perf_counter() - start
+                    after = server_stats(url)
+                    result[run] = {
+                        "seconds": round(elapsed, 3),
+                        "cpu_seconds": round(cpu_seconds() - cpu, 3),
+                        "ok": report.ok,
+                        "failures": len(report.failures),
+                        "requests": after.get("requests", 0) - before.get("requests", 0),
+                        "bytes_sent": after.get("bytes_sent", 0) - before.get("bytes_sent", 0),
+                        "matches_server": tree_digest(instance) == tree_digest(modpack),
+                    }
+            results[shape] = result
+    return results
+
+
+BENCHMARKS = {
+    "hashing": bench_hashing,
+    "checksums": bench_checksums,
+    "resume": bench_resume,
+    "bundles": bench_bundles,
+    "snapshot": bench_snapshot,
+    "cleanup": bench_cleanup,
+    "scheduler": bench_scheduler,
+    "engines": bench_engines,
+    "limiter": bench_limiter,
+    "mirrors": bench_mirrors,
+    "progress": bench_progress,
+    "failures": bench_failures,
+    "plan": bench_plan,
+    "pipeline": bench_pipeline,
+    "vanilla": bench_vanilla,
+    "metadata": bench_metadata,
+    "launch": bench_launch,
+    "sync": bench_sync,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QQQ-CRAFT launcher benchmarks")
+    parser.add_argument("names", nargs="*", metavar="name",
+                        help=f"Бенчмарки для запуску: {', '.join(BENCHMARKS)} (усі за замовчуванням)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 1024],
+                        help="Розміри файлів для хешування, MB")
+    parser.add_argument("--checksum-files", type=int, default=200,
+                        help="Кількість файлів розміру модів для порівняння алгоритмів")
+    parser.add_argument("--checksum-algorithms", nargs="+", default=list(CHECKSUM_ALGORITHMS),
+                        help=f"Алгоритми для порівняння: {', '.join(CHECKSUM_ALGORITHMS)}")
+    parser.add_argument("--resume-mb", type=int, default=64,
+                        help="Розмір файлу для перевірки докачування, MB")
+    parser.add_argument("--bundle-files", type=int, default=10000,
+                        help="Кількість дрібних файлів у синтетичному модпаку")
+    parser.add_argument("--snapshot-files", type=int, default=40000,
+                        help="Кількість файлів у дереві для заміру обходу")
+    parser.add_argument("--snapshot-depth", type=int, default=4,
+                        help="Глибина дерева для заміру обходу")
+    parser.add_argument("--local-files", type=int, default=100000,
+                        help="Кількість локальних файлів для заміру очищення")
+    parser.add_argument("--manifest-files", type=int, default=20000,
+                        help="Кількість файлів маніфесту для заміру очищення")
+    parser.add_argument("--cleanup-sample", type=int, default=2000,
+                        help="Скільки файлів прогнати старим алгоритмом для оцінки")
+    parser.add_argument("--big-mb", type=int, default=32,
+                        help="Розмір найбільшого файлу в заміру планувальника, MB")
+    parser.add_argument("--bandwidth-mb", type=int, default=40,
+                        help="Спільний ліміт швидкості сервера, MB/s")
+    parser.add_argument("--connection-mb", type=int, default=4,
+                        help="Ліміт швидкості одного з'єднання, MB/s")
+    parser.add_argument("--engine-files", type=int, default=10000,
+                        help="Кількість дрібних файлів для порівняння рушіїв")
+    parser.add_argument("--limit-mbit", type=int, default=25,
+                        help="Ліміт швидкості для бенчмарку limiter, Мбіт/с")
+    parser.add_argument("--mirror-files", type=int, default=200,
+                        help="Кількість файлів для бенчмарку mirrors")
+    parser.add_argument("--error-rate", type=float, default=0.2,
+                        help="Частка відповідей 503 нестабільного сервера")
+    parser.add_argument("--progress-files", type=int, default=3000,
+                        help="Кількість дрібних файлів для бенчмарку progress")
+    parser.add_argument("--failure-files", type=int, default=1000,
+                        help="Кількість файлів для бенчмарку failures")
+    parser.add_argument("--dialog-seconds", type=float, default=2.0,
+                        help="Скільки гравець в середньому закриває діалог помилки, с")
+    parser.add_argument("--pipeline-files", type=int, default=150,
+                        help="Кількість модів по 4 MB для бенчмарку pipeline")
+    parser.add_argument("--pipeline-stale", type=int, default=20,
+                        help="Скільки файлів додано й скільки змінено на сервері для бенчмарку pipeline")
+    parser.add_argument("--vanilla-libraries", type=int, default=60,
+                        help="Кількість бібліотек для бенчмарку vanilla")
+    parser.add_argument("--vanilla-assets", type=int, default=3000,
+                        help="Кількість об'єктів ресурсів для бенчмарку vanilla")
+    parser.add_argument("--vanilla-latency", type=float, default=0.02,
+                        help="Затримка сервера на запит для бенчмарку vanilla, с")
+    parser.add_argument("--metadata-versions", type=int, default=800,
+                        help="Кількість версій у синтетичних метаданих для бенчмарку metadata")
+    parser.add_argument("--metadata-latency", type=float, default=0.1,
+                        help="Затримка сервера на запит для бенчмарку metadata, с")
+    parser.add_argument("--launch-libraries", type=int, default=250,
+                        help="Кількість бібліотек ванільної версії для бенчмарку launch")
+    parser.add_argument("--launch-runs", type=int, default=20,
+                        help="Кількість запусків кожного варіанта для бенчмарку launch")
+    parser.add_argument("--shapes", nargs="+", default=sorted(SHAPES),
+                        help=f"Форми модпаків для бенчмарку sync: {', '.join(sorted(SHAPES))}")
+    parser.add_argument("--scale", type=float, default=0.1,
+                        help="Множник кількості та розміру файлів синтетичних модпаків")
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads",
+                        help="Рушій завантаження для бенчмарку sync")
+    parser.add_argument("--change-fraction", type=float, default=0.05,
+                        help="Частка файлів, що змінюються перед частковою синхронізацією")
+    parser.add_argument("--sync-latency", type=float, default=0.0,
+                        help="Затримка сервера для бенчмарку sync, с")
+    parser.add_argument("--sync-bandwidth-mb", type=int, default=0,
+                        help="Ліміт швидкості сервера для бенчмарку sync, MB/s (0 — без ліміту)")
+    parser.add_argument("--sync-error-rate", type=float, default=0.0,
+                        help="Частка відповідей 503 для бенчмарку sync")
+    parser.add_argument("--sync-checksum-algorithm", choices=list(CHECKSUM_ALGORITHMS), default="md5",
+                        help="Алгоритм контрольних сум маніфесту для бенчмарку sync")
+    args = parser.parse_args()
+
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"Невідомі бенчмарки: {', '.join(sorted(unknown))}")
+    unknown = set(args.checksum_algorithms) - set(CHECKSUM_ALGORITHMS)
+    if unknown:
+        parser.error(f"Непідтримувані алгоритми: {', '.join(sorted(unknown))}")
+    unknown = set(args.shapes) - set(SHAPES)
+    if unknown:
+        parser.error(f"Невідомі форми модпаків: {', '.join(sorted(unknown))}")
+
+    report = {}
+    for name in args.names or BENCHMARKS:
+        report[name] = BENCHMARKS[name](args)
+    json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+    print()
+
+
+if __name__ == "__main__":
+    main()
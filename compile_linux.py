@@ -100,7 +100,7 @@ a = Analysis(
     hiddenimports=[
         'flask', 'requests', 'minecraft_launcher_lib', 
         'packaging', 'tkinter', 'webview', 'websockets',
-        'markdown', 'hashlib'
+        'markdown', 'hashlib', 'xxhash'
     ],
     hookspath=[],
     hooksconfig={{}},
@@ -341,7 +341,7 @@ fi
 
 # Встановлення Python залежностей
 if command -v pip3 > /dev/null 2>&1; then
-    pip3 install --user flask requests minecraft-launcher-lib packaging webview websockets markdown
+    pip3 install --user flask requests minecraft-launcher-lib packaging webview websockets markdown xxhash
 fi
 
 echo "QQQ-CRAFT Launcher встановлено успішно!"
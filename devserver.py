@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+QQQ-CRAFT MODPACK STAND-IN SERVER
+Локальний сервер модпаків з тим самим протоколом маніфесту, що й робочий сервер.
+Потрібен для замірів і перевірки синхронізації без доступу до MODPACKS_URL.
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import random
+import socket
+import tarfile
+import hashlib
+import argparse
+import threading
+import urllib.parse
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+SEND_CHUNK_SIZE = 64 * 1024
+MB = 1024 * 1024
+
+# Синтетичні модпаки: папка -> (кількість файлів, мінімальний і максимальний розмір)
+SHAPES = {
+    "tiny": {"config": (10000, 200, 4096)},
+    "huge": {"mods": (50, 32 * MB, 64 * MB)},
+    "mixed": {
+        "config": (2000, 200, 16 * 1024),
+        "mods": (200, 256 * 1024, 4 * MB),
+        "resourcepacks": (5, 16 * MB, 32 * MB),
+    },
+}
+
+
+def new_hasher(algorithm):
+    """Хешер для checksum_algorithm маніфесту: hashlib або xxhash (xxh64, xxh3_64, xxh3_128)"""
+    if algorithm.startswith("xxh"):
+        if xxhash is None:
+            raise SystemExit(f"Для {algorithm} потрібен пакет xxhash")
+        return getattr(xxhash, algorithm)()
+    return hashlib.new(algorithm)
+
+
+def write_file(path, size, rng):
+    """Файл заданого розміру з псевдовипадковим вмістом, що не стискається"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as f:
+        while size > 0:
+            block = rng.randbytes(min(size, MB))
+            f.write(block)
+            size -= len(block)
+
+
+def generate_modpack(path, shape, scale=1.0, seed=0):
+    """Синтетичний модпак однієї з форм SHAPES; scale множить кількість і розмір файлів"""
+    rng = random.Random(seed)
+    path = Path(path)
+    for folder, (count, low, high) in SHAPES[shape].items():
+        for i in range(max(1, int(count * scale))):
+            size = int(rng.randint(low, high) * min(scale, 1.0)) or 1
+            # Дрібні файли розкладаємо по підпапках, як у справжніх конфігах
+            subdir = f"{folder}/group{i % 50:02}" if count > 100 else folder
+            write_file(path / subdir / f"{folder[:3]}{i:05}.bin", size, rng)
+    return path
+
+
+def mutate_modpack(path, fraction=0.05, seed=1):
+    """Часткова зміна модпаку: частина файлів переписується, частина видаляється, додаються нові"""
+    rng = random.Random(seed)
+    files = sorted(p for p in Path(path).rglob("*") if p.is_file())
+    changed = rng.sample(files, max(1, int(len(files) * fraction)))
+    removed, rewritten = changed[::4], [p for i, p in enumerate(changed) if i % 4]
+    for p in removed:
+        p.unlink()
+    for p in rewritten:
+        write_file(p, p.stat().st_size, rng)
+    for p in removed:
+        write_file(p.with_name("new_" + p.name), rng.randint(200, 4096), rng)
+    return {"rewritten": len(rewritten), "removed": len(removed), "added": len(removed)}
+
+
+class ModpackSource:
+    """Модпаки з локальної папки: кожна підпапка root — окремий модпак"""
+
+    def __init__(self, root, algorithm="md5"):
+        self.root = Path(root)
+        self.algorithm = algorithm
+        self.checksums = {}
+        self.lock = threading.Lock()
+
+    def scan(self, directory, prefix=''):
+        """Побудова дерева файлів у форматі маніфесту"""
+        items = []
+        for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+            rel = f"{prefix}/{entry.name}" if prefix else entry.name
+            if entry.is_dir():
+                children = self.scan(entry.path, rel)
+                items.append({
+                    "name": entry.name,
+                    "type": "dir",
+                    "size": sum(child["size"] for child in children),
+                    "children": children,
+                })
+            else:
+                st = entry.stat()
+                items.append({
+                    "name": entry.name,
+                    "type": "file",
+                    "size": st.st_size,
+                    "checksum": self.checksum(entry.path, st),
+                    "url": urllib.parse.quote(rel),
+                    "sync": True,
+                })
+        return items
+
+    def checksum(self, path, st):
+        """Сума файлу; перераховується лише після зміни розміру чи часу модифікації"""
+        key = (st.st_size, st.st_mtime_ns)
+        cached = self.checksums.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        hasher = new_hasher(self.algorithm)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(chunk)
+        self.checksums[path] = (key, hasher.hexdigest())
+        return self.checksums[path][1]
+
+    def manifest(self, modpack, base_url, bundle=None):
+        """Маніфест модпака або None, якщо такого немає"""
+        if not modpack or not (self.root / modpack).is_dir():
+            return None
+        # Дерево скануємо на кожен запит, щоб зміни на диску одразу потрапляли в маніфест
+        with self.lock:
+            files = self.scan(self.root / modpack)
+        manifest = {
+            "status": "ok",
+            "total_size": sum(item["size"] for item in files),
+            "target": modpack,
+            "base_url": base_url,
+            "files": files,
+        }
+        if bundle:
+            manifest["bundle"] = bundle
+        # md5 лишаємо без поля, як у старих маніфестах
+        if self.algorithm != "md5":
+            manifest["checksum_algorithm"] = self.algorithm
+        return manifest
+
+    def resolve(self, target, url):
+        """Шлях до файлу модпака з захистом від виходу за межі папки"""
+        base = (self.root / target).resolve()
+        path = (base / urllib.parse.unquote(url)).resolve()
+        if base not in path.parents or not path.is_file():
+            return None
+        return path
+
+
+class Throttle:
+    """Обмеження швидкості в байтах за секунду через віртуальний годинник"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.next_time = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self, size):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.next_time = max(now, self.next_time) + size / self.rate
+            delay = self.next_time - now
+        time.sleep(delay)
+
+
+class DropConnection(Exception):
+    """Навмисний обрив з'єднання посеред тіла відповіді"""
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        parsed = urllib.parse.urlsplit(self.path)
+        path = parsed.path.strip('/')
+        if path == "stats":
+            self.send_json(self.server.snapshot_stats())
+            return
+        self.server.count("requests")
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.should_fail(path):
+            self.server.count("errors")
+            self.send_error(503)
+            return
+
+        if not path:
+            query = urllib.parse.parse_qs(parsed.query)
+            modpack = query.get("modpack", [""])[0]
+            self.send_manifest(modpack)
+        elif path.startswith("public/"):
+            target, _, url = path[len("public/"):].partition('/')
+            file_path = self.server.source.resolve(target, url)
+            if file_path is None or self.server.is_missing(url):
+                self.send_error(404)
+            else:
+                self.send_file(file_path)
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        path = urllib.parse.urlsplit(self.path).path.strip('/')
+        self.server.count("requests")
+
+        if not self.server.bundles or not path.startswith("bundle/"):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            urls = json.loads(self.rfile.read(length))["files"]
+        except (ValueError, KeyError):
+            self.send_error(400)
+            return
+        self.send_bundle(path[len("bundle/"):], urls)
+
+    def send_bundle(self, target, urls):
+        """Група дрібних файлів одним tar.gz; імена членів — url з маніфесту"""
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode='w:gz', compresslevel=6) as tar:
+            for url in urls:
+                file_path = self.server.source.resolve(target, url)
+                if file_path is not None:
+                    tar.add(file_path, arcname=url, recursive=False)
+        body = buffer.getvalue()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count("bytes_sent", len(body))
+        self.server.count("bundles")
+
+    def send_json(self, data, status=200, etag=False):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        tag = f'"{hashlib.md5(body).hexdigest()}"'
+        if etag and self.headers.get("If-None-Match") == tag:
+            self.send_response(304)
+            self.send_header("ETag", tag)
+            self.end_headers()
+            self.server.count("not_modified")
+            return
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if etag:
+            self.send_header("ETag", tag)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.count("bytes_sent", len(body))
+
+    def send_manifest(self, modpack):
+        bundle = "bundle" if self.server.bundles else None
+        manifest = self.server.source.manifest(modpack, self.server.url, bundle)
+        if manifest is None:
+            self.send_json({"status": "error", "message": f"Модпак {modpack} не знайдено"})
+        else:
+            self.send_json(manifest, etag=True)
+
+    def send_file(self, file_path):
+        st = file_path.stat()
+        size = st.st_size
+        tag = f'"{size:x}-{st.st_mtime_ns:x}"'
+        start, end = 0, size - 1
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get("Range", ""))
+
+        if not match and self.headers.get("If-None-Match") == tag:
+            self.send_response(304)
+            self.send_header("ETag", tag)
+            self.end_headers()
+            self.server.count("not_modified")
+            return
+        if match:
+            start = int(match.group(1))
+            if match.group(2):
+                end = min(int(match.group(2)), size - 1)
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+
+        length = end - start + 1
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", tag)
+        self.end_headers()
+
+        drop_at = self.server.drop_point(file_path)
+        throttle = Throttle(self.server.connection_bandwidth)
+        sent = 0
+        with open(file_path, 'rb') as f:
+            f.seek(start)
+            while sent < length:
+                chunk = f.read(min(SEND_CHUNK_SIZE, length - sent))
+                if not chunk:
+                    break
+                if drop_at is not None and sent + len(chunk) > drop_at:
+                    chunk = chunk[:drop_at - sent]
+                    self.wfile.write(chunk)
+                    self.server.count("bytes_sent", len(chunk))
+                    self.wfile.flush()
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    raise DropConnection(f"{file_path.name} after {drop_at} bytes")
+                throttle.wait(len(chunk))
+                self.server.throttle.wait(len(chunk))
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                self.server.count("bytes_sent", len(chunk))
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Сервер модпаків із керованими збоями для замірів"""
+
+    daemon_threads = True
+
+    def __init__(self, root, host="127.0.0.1", port=0, drop_after=None, drop_count=1,
+                 bundles=False, bandwidth=None, connection_bandwidth=None, latency=0.0,
+                 error_rate=0.0, missing_rate=0.0, unavailable=False, checksum_algorithm="md5",
+                 verbose=False):
+        super().__init__((host, port), StandInHandler)
+        self.source = ModpackSource(root, checksum_algorithm)
+        self.bundles = bundles
+        self.throttle = Throttle(bandwidth)
+        self.connection_bandwidth = connection_bandwidth
+        self.latency = latency
+        self.error_rate = error_rate
+        self.missing_rate = missing_rate
+        self.unavailable = unavailable
+        self.drop_after = drop_after
+        self.drop_count = drop_count
+        self.verbose = verbose
+        self.stats = {"requests": 0, "bytes_sent": 0}
+        self.drops = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key, value=1):
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + value
+
+    def snapshot_stats(self):
+        with self.lock:
+            return dict(self.stats)
+
+    def should_fail(self, path):
+        """Відповідати 503: завжди, якщо сервер «лежить», або для частини запитів файлів"""
+        if self.unavailable:
+            return True
+        return path.startswith("public/") and random.random() < self.error_rate
+
+    def is_missing(self, url):
+        """Стабільна для кожного файлу частка «зниклих» файлів, на які завжди 404"""
+        if not self.missing_rate:
+            return False
+        return int(hashlib.md5(url.encode()).hexdigest(), 16) % 10000 < self.missing_rate * 10000
+
+    def drop_point(self, file_path):
+        """Кількість байтів тіла, після якої обірвати цю відповідь"""
+        if self.drop_after is None:
+            return None
+        with self.lock:
+            dropped = self.drops.get(file_path, 0)
+            if dropped >= self.drop_count:
+                return None
+            self.drops[file_path] = dropped + 1
+            self.stats["drops"] = self.stats.get("drops", 0) + 1
+        return self.drop_after
+
+    def handle_error(self, request, client_address):
+        exc = sys.exc_info()[1]
+        if isinstance(exc, (DropConnection, ConnectionError)):
+            return
+        super().handle_error(request, client_address)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QQQ-CRAFT modpack stand-in server")
+    parser.add_argument("root", help="Папка, де кожна підпапка — модпак")
+    parser.add_argument("--generate", choices=sorted(SHAPES), default=None,
+                        help="Створити в root синтетичний модпак цієї форми з такою ж назвою")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="Множник кількості та розміру файлів синтетичного модпаку")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=25777)
+    parser.add_argument("--drop-after", type=int, default=None,
+                        help="Обривати з'єднання після стількох байтів тіла файлу")
+    parser.add_argument("--drop-count", type=int, default=1,
+                        help="Скільки разів обривати завантаження кожного файлу")
+    parser.add_argument("--bundles", action="store_true",
+                        help="Віддавати дрібні файли групами через POST /bundle/<модпак>")
+    parser.add_argument("--bandwidth", type=int, default=None,
+                        help="Спільний ліміт швидкості для всіх з'єднань, байт/с")
+    parser.add_argument("--connection-bandwidth", type=int, default=None,
+                        help="Ліміт швидкості одного з'єднання, байт/с")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Затримка перед кожною відповіддю, с")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Частка запитів файлів, на які сервер відповідає 503")
+    parser.add_argument("--missing-rate", type=float, default=0.0,
+                        help="Частка файлів, на які сервер завжди відповідає 404")
+    parser.add_argument("--unavailable", action="store_true",
+                        help="Відповідати 503 на всі запити")
+    parser.add_argument("--checksum-algorithm", default="md5",
+                        help="Алгоритм контрольних сум у маніфесті: md5, sha256, blake2b, xxh3_64...")
+    args = parser.parse_args()
+
+    if args.generate and not (Path(args.root) / args.generate).exists():
+        generate_modpack(Path(args.root) / args.generate, args.generate, args.scale)
+
+    server = StandInServer(args.root, args.host, args.port, args.drop_after, args.drop_count,
+                           bundles=args.bundles, bandwidth=args.bandwidth,
+                           connection_bandwidth=args.connection_bandwidth, latency=args.latency,
+                           error_rate=args.error_rate, missing_rate=args.missing_rate,
+                           unavailable=args.unavailable, checksum_algorithm=args.checksum_algorithm,
+                           verbose=True)
+    print(f"Сервер модпаків: {server.url}/?modpack=<назва>", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nСервер зупинено")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
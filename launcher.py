@@ -7,9 +7,14 @@ import os
 import re
 import sys
 import json
+import mmap
 import uuid
 import time
+import heapq
+import queue
+import random
 import shutil
+import tarfile
 import urllib
 import hashlib
 import logging
@@ -18,10 +23,12 @@ import threading
 import subprocess
 import traceback
 from pathlib import Path
-from typing import Dict, Optional, Tuple, Any
-from dataclasses import dataclass, asdict
+from typing import Dict, NamedTuple, Optional, Tuple, Any
+from dataclasses import dataclass, field, asdict
 
 import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
 from flask import Flask, render_template, request, jsonify, send_from_directory, redirect
 from tkinter import messagebox, scrolledtext
 from packaging import version
@@ -34,16 +41,89 @@ import markdown
 import concurrent.futures
 import threading
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None  # Необов'язковий: швидкі некриптографічні суми для маніфестів
+
 VERSION = "1.0.25.0"
 FLASK_PORT = 6724
 WEBSOCKET_PORT = 5263
 
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Блок запису в .part: при обриві втрачається лише недочитаний блок, тож він невеликий
+PART_CHUNK_SIZE = 64 * 1024
+PARTIAL_SUFFIX = ".part"
+PARTIAL_META_SUFFIX = ".part.json"
+INSTALL_STATE_FILE = ".install.json"  # Відбиток завершеного встановлення лоадера в інстансі
+LAUNCH_CACHE_FILE = ".launch.json"  # Готова команда запуску інстансу
+# Значення, що змінюються між запусками: у кеші команди замість них стоять ці мітки
+LAUNCH_PLACEHOLDERS = {
+    "username": "${qqq_username}",
+    "uuid": "${qqq_uuid}",
+    "resolutionWidth": "${qqq_width}",
+    "resolutionHeight": "${qqq_height}",
+}
+DOWNLOAD_RETRIES = 5
+DOWNLOAD_WORKERS = 10
+DOWNLOAD_MIN_WORKERS = 2
+DOWNLOAD_MAX_WORKERS = 32
+SCHEDULER_INTERVAL = 1.0
+VERIFY_WORKERS = os.cpu_count() or 4  # Хешування впирається в процесор, а не в мережу
+PIPELINE_QUEUE_SIZE = 256
+PROGRESS_INTERVAL = 0.1  # 10 подій прогресу на секунду
+PLAN_TTL = 120  # Скільки секунд готовий план вважається актуальним
+ASYNC_CONCURRENCY = 256
+PRIORITY_FILE_LIMIT = 1024 * 1024  # Файли до цього розміру йдуть пріоритетною смугою
+DOWNLOAD_LIMITS = [0, 5, 10, 25, 50, 100]  # Мбіт/с, 0 — без обмеження
+ASYNC_CONNECTIONS_PER_HOST = 64
+ASYNC_DISK_WORKERS = 4
+ASYNC_TIMEOUT = 30
+BUNDLE_FILE_LIMIT = 64 * 1024
+BUNDLE_MAX_FILES = 500
+BUNDLE_MAX_BYTES = 8 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+# Алгоритми, які маніфест може оголосити в полі checksum_algorithm.
+# Старі маніфести цього поля не мають — для них md5
+DEFAULT_CHECKSUM_ALGORITHM = "md5"
+CHECKSUM_ALGORITHMS = {
+    "md5": hashlib.md5,
+    "sha1": hashlib.sha1,
+    "sha256": hashlib.sha256,
+    "blake2b": hashlib.blake2b,
+    "blake2s": hashlib.blake2s,
+}
+if xxhash is not None:
+    CHECKSUM_ALGORITHMS.update({
+        "xxh64": xxhash.xxh64,
+        "xxh3_64": xxhash.xxh3_64,
+        "xxh3_128": xxhash.xxh3_128,
+    })
+
 MODPACKS_URL = "http://188.40.152.223:25777/"
+MODPACKS_URLS = [MODPACKS_URL]  # Дзеркала в порядку пріоритету
+MIRROR_PROBE_TIMEOUT = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+VERSION_MANIFEST_URL = "https://launchermeta.mojang.com/mc/game/version_manifest_v2.json"
+ASSETS_URL = "https://resources.download.minecraft.net"
+FORGE_MAVEN_METADATA_URL = "https://maven.minecraftforge.net/net/minecraftforge/forge/maven-metadata.xml"
+FABRIC_LOADERS_URL = "https://meta.fabricmc.net/v2/versions/loader"
+FABRIC_PROFILE_URL = "https://meta.fabricmc.net/v2/versions/loader/{version}/{loader_version}/profile/json"
+FABRIC_VERSION_ID = re.compile(r'fabric-loader-([^-]+)-(.+)')
+METADATA_TTL = 3600  # Скільки секунд метадані версій вважаються свіжими без перевірки
+METADATA_TIMEOUT = 10
+RUNTIME_DIRS = ("versions", "libraries", "assets", "runtime")  # Спільне для всіх інстансів
 GITHUB_REPO = "https://api.github.com/repos/mrbear22/qqq-craft/releases/latest"
 NEWS_URL = "https://qqq-craft.top/news/?get"
 
 IS_WINDOWS = platform.system() == "Windows"
 IS_LINUX = platform.system() == "Linux"
+# Назви ОС і розрядність у правилах version JSON від Mojang
+MOJANG_OS = "windows" if IS_WINDOWS else "linux"
+MOJANG_ARCH = "32" if platform.architecture()[0] == "32bit" else "64"
 
 if not (IS_WINDOWS or IS_LINUX):
     raise OSError(f"Unsupported platform: {platform.system()}")
@@ -95,12 +175,111 @@ class Config:
     multiplayer: bool = True
     console: bool = False
     fullscreen: bool = False
+    engine: str = "threads"
+    download_limit: int = 0  # Мбіт/с, 0 — без обмеження
+
+@dataclass
+class FileFailure:
+    path: str
+    url: str
+    error: str  # Клас винятку
+    message: str
+    attempts: int
+
+@dataclass
+class SyncReport:
+    ok: bool = True
+    error: str = ""  # Помилка, через яку синхронізація не відбулася взагалі
+    files: int = 0
+    failures: list = field(default_factory=list)
+    
+    def __bool__(self):
+        return self.ok
+    
+    def summary(self, limit: int = 10) -> str:
+        if self.error:
+            return self.error
+        lines = [f"Не вдалося завантажити {len(self.failures)} з {self.files} файлів:"]
+        lines += [
+            f"{f.path}: {f.error} після {f.attempts} спроб ({f.message})"
+            for f in self.failures[:limit]
+        ]
+        if len(self.failures) > limit:
+            lines.append(f"...та ще {len(self.failures) - limit}")
+        return "\n".join(lines)
+
+@dataclass
+class SyncPlan:
+    # Що зробить синхронізація: будується до завантаження і потім же виконується
+    modpack: str
+    target_dir: Path
+    fetched: Dict = field(default_factory=dict)
+    error: str = ""
+    files: Dict[str, Dict] = field(default_factory=dict)  # Усі файли маніфесту
+    fetch: Dict[str, Dict] = field(default_factory=dict)  # Файлів немає на диску
+    verify: Dict[str, Dict] = field(default_factory=dict)  # Є, але потрібне хешування
+    delete: list = field(default_factory=list)
+    skipped: int = 0  # Байти файлів, які вже на місці
+    stored: int = 0  # Байти, що вже є у сховищі об'єктів
+    up_to_date: bool = False
+    deep_verify: bool = False
+    algorithm: str = DEFAULT_CHECKSUM_ALGORITHM  # Алгоритм контрольних сум з маніфесту
+    bytes_per_second: Optional[float] = None
+    created: float = field(default_factory=time.monotonic)
+    index: Any = None
+    snapshot: Any = None
+    
+    @property
+    def fetch_bytes(self) -> int:
+        return sum(info['size'] for info in self.fetch.values())
+    
+    @property
+    def verify_bytes(self) -> int:
+        return sum(info['size'] for info in self.verify.values())
+    
+    @property
+    def download_bytes(self) -> int:
+        return self.fetch_bytes - self.stored
+    
+    @property
+    def estimated_seconds(self) -> Optional[float]:
+        if not self.download_bytes:
+            return 0.0
+        if not self.bytes_per_second:
+            return None
+        return self.download_bytes / self.bytes_per_second
+    
+    def summary(self) -> Dict:
+        return {
+            "modpack": self.modpack,
+            "error": self.error,
+            "up_to_date": self.up_to_date,
+            "files": len(self.files),
+            "files_to_fetch": len(self.fetch),
+            "bytes_to_fetch": self.fetch_bytes,
+            "bytes_to_download": self.download_bytes,
+            "files_to_verify": len(self.verify),
+            "bytes_to_verify": self.verify_bytes,
+            "files_to_delete": len(self.delete),
+            "checksum_algorithm": self.algorithm,
+            "estimated_seconds": self.estimated_seconds,
+        }
+
+class DownloadError(Exception):
+    # Остаточна невдача після всіх спроб; причина — у __cause__
+    def __init__(self, url: str, attempts: int, cause: Exception):
+        super().__init__(str(cause))
+        self.url = url
+        self.attempts = attempts
+        self.cause = cause
 
 class PathManager:
-    def __init__(self):
+    def __init__(self, base_dir: Optional[Path] = None):
         try:
             self.home = Path.home()
-            if IS_WINDOWS:
+            if base_dir:
+                self.base_dir = Path(base_dir)
+            elif IS_WINDOWS:
                 self.base_dir = self.home / "AppData" / "Local" / "Programs" / "qqq-craft"
             else:  # Linux
                 self.base_dir = self.home / ".local" / "share" / "qqq-craft"
@@ -116,6 +295,25 @@ class PathManager:
     
     def get_install_dir(self, loader: str) -> Path:
         return self.base_dir / "instances" / loader
+    
+    def get_index_path(self, instance: str) -> Path:
+        return self.base_dir / "index" / f"{instance}.json"
+    
+    def get_manifests_dir(self) -> Path:
+        return self.base_dir / "manifests"
+    
+    def get_manifest_path(self, instance: str) -> Path:
+        return self.get_manifests_dir() / f"{instance}.json"
+    
+    def get_objects_dir(self) -> Path:
+        return self.base_dir / "objects"
+    
+    def get_runtime_dir(self) -> Path:
+        # Версії, бібліотеки, ресурси та Java, спільні для всіх інстансів
+        return self.base_dir / "runtime"
+    
+    def get_metadata_dir(self) -> Path:
+        return self.base_dir / "metadata"
 
 class DataManager:
     def __init__(self, path_manager: PathManager):
@@ -194,6 +392,17 @@ class Validator:
             if window_size not in valid_sizes:
                 window_size = '1280x720'
             
+            engine = data.get('engine', 'threads')
+            if engine not in ['threads', 'asyncio']:
+                engine = 'threads'
+            
+            try:
+                download_limit = int(data.get('download_limit', 0))
+            except (TypeError, ValueError):
+                download_limit = 0
+            if download_limit not in DOWNLOAD_LIMITS:
+                download_limit = 0
+            
             config = Config(
                 nickname=data.get('nickname', '').strip(),
                 loader=loader,
@@ -201,7 +410,9 @@ class Validator:
                 window_size=window_size,
                 multiplayer=bool(data.get('multiplayer', True)),
                 console=bool(data.get('console', False)),
-                fullscreen=bool(data.get('fullscreen', False))
+                fullscreen=bool(data.get('fullscreen', False)),
+                engine=engine,
+                download_limit=download_limit
             )
             
             return True, "OK", config
@@ -229,9 +440,65 @@ class MinecraftLauncher:
             )
             return str(uuid.uuid4())
  
+    @staticmethod
+    def launch_files(version_id: str, runtime_dir: Path) -> list:
+        # version JSON з усім ланцюжком inheritsFrom: від них залежить команда
+        paths = []
+        while version_id:
+            path = runtime_dir / "versions" / version_id / f"{version_id}.json"
+            paths.append(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                version_id = json.load(f).get('inheritsFrom')
+        return paths
+    
+    @staticmethod
+    def files_key(paths) -> Dict[str, int]:
+        return {str(path): os.stat(path).st_mtime_ns for path in paths}
+    
+    def build_command(self, version_id: str, runtime_dir: Path, install_dir: Path, options: Dict) -> Tuple[list, bool]:
+        # Розбір version JSON, злиття успадкування та обхід бібліотек робимо лише
+        # коли змінилася версія, налаштування або сама версія була перевстановлена
+        template = {**options, **LAUNCH_PLACEHOLDERS}
+        digest = hashlib.sha256(json.dumps(
+            [version_id, str(runtime_dir), minecraft_launcher_lib.utils.get_library_version(), template],
+            sort_keys=True
+        ).encode()).hexdigest()
+        cache_path = install_dir / LAUNCH_CACHE_FILE
+        values = {LAUNCH_PLACEHOLDERS[key]: str(options[key]) for key in LAUNCH_PLACEHOLDERS}
+        
+        def fill(command):
+            filled = []
+            for arg in command:
+                if "${qqq_" in arg:
+                    for placeholder, value in values.items():
+                        arg = arg.replace(placeholder, value)
+                filled.append(arg)
+            return filled
+        
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('digest') == digest and self.files_key(cached['files']) == cached['files']:
+                return fill(cached['command']), True
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        
+        command = minecraft_launcher_lib.command.get_minecraft_command(version_id, str(runtime_dir), template)
+        try:
+            files = self.launch_files(version_id, runtime_dir)
+            state_path = install_dir / INSTALL_STATE_FILE
+            if state_path.is_file():
+                files.append(state_path)  # Перевстановлення могло змінити Java чи бібліотеки
+            atomic_write_json(cache_path, {'digest': digest, 'files': self.files_key(files), 'command': command})
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Failed to cache launch command: {e}")
+        return fill(command), False
+    
     def launch(self, config: Config, progress_callback=None) -> bool:
         try:
+            start = time.perf_counter()
             install_dir = self.path_manager.get_install_dir(config.loader)
+            runtime_dir = self.path_manager.get_runtime_dir()
             
             if not install_dir.exists():
                 error_msg = "Папка гри не знайдена"
@@ -265,9 +532,10 @@ class MinecraftLauncher:
             if config.multiplayer:
                 options["quickPlayMultiplayer"] = "play.qqq-craft.top"
             
-            command = minecraft_launcher_lib.command.get_minecraft_command(
-                config.loader, str(install_dir), options
-            )
+            # Версія та бібліотеки — зі спільної папки, світи й налаштування — з інстансу
+            # Значення loader у формі — це вже назва версії (fabric-loader-..., 1.21.1)
+            version_id = config.loader
+            command, cached = self.build_command(version_id, runtime_dir, install_dir, options)
             
             if progress_callback:
                 progress_callback("Запуск гри...")
@@ -283,6 +551,10 @@ class MinecraftLauncher:
                 stdout=subprocess.DEVNULL if not config.console else None,
                 stderr=subprocess.DEVNULL if not config.console else None
             )
+            self.logger.info(
+                f"Started {version_id} in {(time.perf_counter() - start) * 1000:.0f} ms "
+                f"(launch command {'cached' if cached else 'built'})"
+            )
             
             return True
             
@@ -297,30 +569,897 @@ class MinecraftLauncher:
             )
             return False
 
+class Hasher:
+    @staticmethod
+    def supports(algorithm: str) -> bool:
+        return algorithm in CHECKSUM_ALGORITHMS
+    
+    @staticmethod
+    def new(algorithm: str = DEFAULT_CHECKSUM_ALGORITHM):
+        return CHECKSUM_ALGORITHMS[algorithm]()
+    
+    @staticmethod
+    def digest(data: bytes, algorithm: str = DEFAULT_CHECKSUM_ALGORITHM) -> str:
+        h = Hasher.new(algorithm)
+        h.update(data)
+        return h.hexdigest()
+    
+    @staticmethod
+    def file_digest(path, algorithm: str = DEFAULT_CHECKSUM_ALGORITHM) -> str:
+        # Читаємо блоками фіксованого розміру (великі файли — через mmap),
+        # тож пам'ять не залежить від розміру файлу
+        h = Hasher.new(algorithm)
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size >= MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    view = memoryview(mapped)
+                    try:
+                        for offset in range(0, size, HASH_CHUNK_SIZE):
+                            h.update(view[offset:offset + HASH_CHUNK_SIZE])
+                    finally:
+                        view.release()
+            else:
+                buffer = bytearray(HASH_CHUNK_SIZE)
+                view = memoryview(buffer)
+                while True:
+                    n = f.readinto(buffer)
+                    if not n:
+                        break
+                    h.update(view[:n])
+        return h.hexdigest()
+
+class FileStat(NamedTuple):
+    st_size: int
+    st_mtime_ns: int
+    st_ino: int
+
+class TreeSnapshot:
+    # Один прохід os.scandir по дереву інстансу: розміри й stat файлів
+    # та готові суми для кожної папки. З paths — лише stat цих файлів, без обходу й сум папок
+    def __init__(self, root: Path, paths=None):
+        self.root = root
+        self.files: Dict[str, FileStat] = {}
+        self.dir_sizes: Dict[str, int] = {}
+        if paths is not None:
+            for rel in paths:
+                try:
+                    st = os.stat(root / rel)
+                except OSError:
+                    continue
+                self.files[rel] = FileStat(st.st_size, st.st_mtime_ns, st.st_ino)
+        elif root.is_dir():
+            self.dir_sizes[''] = self.scan(str(root), '')
+    
+    def scan(self, directory: str, prefix: str) -> int:
+        total = 0
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                rel = f"{prefix}/{entry.name}" if prefix else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    size = self.scan(entry.path, rel)
+                    self.dir_sizes[rel] = size
+                elif entry.is_file():
+                    st = entry.stat()
+                    # На Windows DirEntry.stat() не заповнює st_ino, а inode() — так
+                    self.files[rel] = FileStat(st.st_size, st.st_mtime_ns, entry.inode())
+                    size = st.st_size
+                else:
+                    continue
+                total += size
+        return total
+    
+    def dir_size(self, rel_dir: str) -> Optional[int]:
+        return self.dir_sizes.get(rel_dir)
+    
+    def remove(self, rel_path: str):
+        st = self.files.pop(rel_path, None)
+        if st is None:
+            return
+        parts = rel_path.split('/')[:-1]
+        for depth in range(len(parts), -1, -1):
+            ancestor = '/'.join(parts[:depth])
+            if ancestor in self.dir_sizes:
+                self.dir_sizes[ancestor] -= st.st_size
+
+def atomic_write(path: Path, data: bytes):
+    # Пишемо поруч у .part і підміняємо одним os.replace:
+    # після збою лишається або старий файл, або новий, але не обрізаний
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + PARTIAL_SUFFIX)
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            tmp.unlink(missing_ok=True)
+        except OSError:
+            pass
+        raise
+
+def atomic_write_json(path: Path, data, **options):
+    atomic_write(path, json.dumps(data, **options).encode('utf-8'))
+
+class FileIndex:
+    # Відносний шлях -> [size, mtime_ns, inode, checksum] з останньої перевірки.
+    # Для сум не за md5 п'ятим елементом іде алгоритм
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: Dict[str, list] = {}
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        self.load()
+    
+    @staticmethod
+    def stat_key(st) -> list:
+        return [st.st_size, st.st_mtime_ns, st.st_ino]
+    
+    def load(self):
+        try:
+            if self.path.exists():
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+        except Exception as e:
+            self.logger.warning(f"File index {self.path} is unreadable, rebuilding: {e}")
+            self.entries = {}
+    
+    def lookup(self, rel_path: str, st, algorithm: str = DEFAULT_CHECKSUM_ALGORITHM) -> Optional[str]:
+        # Сума іншим алгоритмом нічого не каже про файл — його треба перехешувати
+        entry = self.entries.get(rel_path)
+        if entry and entry[:3] == self.stat_key(st):
+            stored = entry[4] if len(entry) > 4 else DEFAULT_CHECKSUM_ALGORITHM
+            if stored == algorithm:
+                return entry[3]
+        return None
+    
+    def update(self, rel_path: str, st, checksum: str, algorithm: str = DEFAULT_CHECKSUM_ALGORITHM):
+        entry = self.stat_key(st) + [checksum]
+        if algorithm != DEFAULT_CHECKSUM_ALGORITHM:
+            entry.append(algorithm)
+        with self.lock:
+            self.entries[rel_path] = entry
+    
+    def prune(self, keep_paths):
+        keep_paths = set(keep_paths)
+        with self.lock:
+            self.entries = {p: e for p, e in self.entries.items() if p in keep_paths}
+    
+    def save(self):
+        try:
+            with self.lock:
+                atomic_write_json(self.path, self.entries, separators=(',', ':'))
+        except Exception as e:
+            self.logger.error(f"Failed to save file index {self.path}: {e}")
+
+class ObjectStore:
+    # Спільне для всіх інстансів сховище файлів за контрольною сумою
+    def __init__(self, root: Path):
+        self.root = root
+        self.index = FileIndex(root / "index.json")
+        self.locks: Dict[str, threading.Lock] = {}
+        self.locks_lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+        self.algorithm = DEFAULT_CHECKSUM_ALGORITHM  # Алгоритм маніфесту поточної синхронізації
+        self.reset_stats()
+    
+    def reset_stats(self):
+        self.stats = {'fetched': 0, 'deduplicated': 0, 'linked': 0, 'copied': 0}
+    
+    @staticmethod
+    def object_name(checksum: str, algorithm: str) -> str:
+        # Об'єкти за md5 лежать як і раніше, решта — в окремій папці алгоритму
+        if algorithm == DEFAULT_CHECKSUM_ALGORITHM:
+            return f"{checksum[:2]}/{checksum}"
+        return f"{algorithm}/{checksum[:2]}/{checksum}"
+    
+    def object_path(self, checksum: str, algorithm: Optional[str] = None) -> Path:
+        return self.root / self.object_name(checksum, algorithm or self.algorithm)
+    
+    def lock_for(self, checksum: str) -> threading.Lock:
+        with self.locks_lock:
+            return self.locks.setdefault(checksum, threading.Lock())
+    
+    def has(self, info: Dict) -> bool:
+        obj = self.object_path(info['checksum'])
+        try:
+            st = obj.stat()
+        except FileNotFoundError:
+            return False
+        if st.st_size == info['size']:
+            checksum = self.index.lookup(obj.name, st, self.algorithm)
+            if checksum is None:
+                checksum = Hasher.file_digest(obj, self.algorithm)
+                self.index.update(obj.name, st, checksum, self.algorithm)
+            if checksum == info['checksum']:
+                return True
+        # Об'єкт змінили на місці через жорстке посилання — викидаємо його
+        self.logger.warning(f"Object {obj.name} is corrupted, refetching")
+        obj.unlink(missing_ok=True)
+        return False
+    
+    def count(self, key: str, size: int):
+        with self.locks_lock:
+            self.stats[key] += size
+    
+    def put(self, info: Dict, data: bytes):
+        atomic_write(self.object_path(info['checksum']), data)
+        self.record(info)
+    
+    def record(self, info: Dict):
+        obj = self.object_path(info['checksum'])
+        self.index.update(obj.name, obj.stat(), info['checksum'], self.algorithm)
+        self.count('fetched', info['size'])
+    
+    def materialize(self, info: Dict, local: Path, link: bool = True):
+        # Жорстке посилання, а де це неможливо (інший диск, FAT) — копія разом із правами доступу
+        obj = self.object_path(info['checksum'])
+        tmp = local.with_name(local.name + PARTIAL_SUFFIX)
+        tmp.unlink(missing_ok=True)
+        try:
+            if not link:
+                raise OSError("link disabled")
+            os.link(obj, tmp)
+            self.count('linked', info['size'])
+        except OSError:
+            shutil.copy2(obj, tmp)
+            self.count('copied', info['size'])
+        os.replace(tmp, local)
+    
+    def prune(self, keep: set) -> Tuple[int, int]:
+        # Видаляємо об'єкти, яких немає в keep (шляхи від object_name), та недокачані
+        # частини, що вже не знадобляться. Повертає кількість файлів і звільнені байти
+        removed = freed = 0
+        kept = set()
+        for dirpath, _, filenames in os.walk(self.root, topdown=False):
+            for name in filenames:
+                path = Path(dirpath) / name
+                if path.parent == self.root:
+                    continue  # Індекс сховища; об'єкти лежать лише в підпапках
+                rel_path = path.relative_to(self.root).as_posix()
+                partial = None
+                for suffix in (PARTIAL_META_SUFFIX, PARTIAL_SUFFIX):
+                    if rel_path.endswith(suffix):
+                        partial = rel_path[:-len(suffix)]
+                        break
+                if partial is not None:
+                    needed = partial in keep and not (self.root / partial).exists()
+                else:
+                    needed = rel_path in keep
+                if needed:
+                    kept.add(name)
+                    continue
+                try:
+                    size = path.stat().st_size
+                    path.unlink()
+                    removed += 1
+                    freed += size
+                except OSError as e:
+                    self.logger.warning(f"Failed to remove object {rel_path}: {e}")
+            if dirpath != str(self.root):
+                try:
+                    os.rmdir(dirpath)  # Лише порожні папки
+                except OSError:
+                    pass
+        self.index.prune(kept)
+        return removed, freed
+    
+    def save(self):
+        self.index.save()
+
+class DownloadScheduler:
+    # Черга «найбільші файли першими» з кількістю потоків, яку раз на інтервал
+    # підлаштовуємо під виміряну швидкість і частку помилок
+    def __init__(self, bytes_counter, on_stats=None, initial_workers: int = DOWNLOAD_WORKERS,
+                 min_workers: int = DOWNLOAD_MIN_WORKERS, max_workers: int = DOWNLOAD_MAX_WORKERS,
+                 largest_first: bool = True):
+        self.bytes_counter = bytes_counter
+        self.on_stats = on_stats
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.target = max(min_workers, min(initial_workers, max_workers))
+        self.largest_first = largest_first
+        self.queue = []
+        self.sequence = 0
+        self.workers = self.running = 0
+        self.completed = self.errors = 0
+        self.closed = False
+        self.cond = threading.Condition()
+        self.logger = logging.getLogger(__name__)
+    
+    def submit(self, size: int, fn, *args):
+        with self.cond:
+            self.sequence += 1
+            priority = -size if self.largest_first else 0
+            heapq.heappush(self.queue, (priority, self.sequence, fn, args))
+            self.cond.notify()
+    
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+    
+    def worker(self):
+        while True:
+            with self.cond:
+                while not self.queue and not self.closed and self.workers <= self.target:
+                    self.cond.wait()
+                if self.workers > self.target or not self.queue:
+                    self.workers -= 1
+                    self.cond.notify_all()
+                    return
+                _, _, fn, args = heapq.heappop(self.queue)
+                self.running += 1
+            
+            failed = False
+            try:
+                failed = fn(*args) is False
+            except Exception as e:
+                self.logger.error(f"Download task failed: {e}")
+                failed = True
+            
+            with self.cond:
+                self.running -= 1
+                self.completed += 1
+                self.errors += failed
+                self.cond.notify_all()
+    
+    def spawn(self):
+        with self.cond:
+            missing = min(self.target, len(self.queue) + self.running) - self.workers
+            self.workers += max(missing, 0)
+        for _ in range(max(missing, 0)):
+            threading.Thread(target=self.worker, daemon=True).start()
+    
+    def tune(self, throughput: float, last_throughput: float, completed: int, errors: int, grew: bool):
+        # Багато помилок — різко зменшуємо; швидкість росте — додаємо потоки;
+        # після збільшення швидкість впала — повертаємось назад
+        target = self.target
+        if completed and errors / completed > 0.2:
+            target = max(self.min_workers, target // 2)
+        elif throughput > last_throughput * 1.05 and self.queue:
+            target = min(self.max_workers, target + 2)
+        elif grew and throughput < last_throughput * 0.9:
+            target = max(self.min_workers, target - 2)
+        with self.cond:
+            self.target = target
+            self.cond.notify_all()
+    
+    def run(self):
+        # Блокує, доки не закрито чергу і не виконано всі завдання
+        last_bytes, last_time = self.bytes_counter(), time.time()
+        last_throughput, last_completed, last_errors, grew = 0.0, 0, 0, False
+        while True:
+            self.spawn()
+            with self.cond:
+                if self.closed and not self.queue and not self.running:
+                    break
+                self.cond.wait(SCHEDULER_INTERVAL)
+            
+            now = time.time()
+            if now - last_time < SCHEDULER_INTERVAL:
+                continue
+            current = self.bytes_counter()
+            throughput = (current - last_bytes) / (now - last_time)
+            with self.cond:
+                completed, errors = self.completed - last_completed, self.errors - last_errors
+                last_completed, last_errors = self.completed, self.errors
+            
+            previous = self.target
+            self.tune(throughput, last_throughput, completed, errors, grew)
+            grew = self.target > previous
+            last_bytes, last_time, last_throughput = current, now, throughput
+            
+            if self.on_stats:
+                self.on_stats({
+                    'workers': self.target,
+                    'bytes_per_second': int(throughput),
+                    'queue': len(self.queue),
+                    'running': self.running,
+                    'errors': self.errors,
+                })
+        self.close()
+
+class AsyncResponse:
+    def __init__(self, client, key, reader, writer, status, headers, semaphore):
+        self.client = client
+        self.key = key
+        self.reader = reader
+        self.writer = writer
+        self.status_code = status
+        self.headers = headers
+        self.semaphore = semaphore
+        self.complete = False
+        self.keep_alive = headers.get('Connection', '').lower() != 'close'
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+    
+    async def read_chunk(self, size):
+        return await asyncio.wait_for(self.reader.read(size), ASYNC_TIMEOUT)
+    
+    async def iter_chunks(self, size=DOWNLOAD_CHUNK_SIZE):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            while True:
+                line = await asyncio.wait_for(self.reader.readline(), ASYNC_TIMEOUT)
+                length = int(line.split(b';')[0].strip() or b'0', 16)
+                if not length:
+                    while (await self.reader.readline()).strip():
+                        pass
+                    break
+                while length:
+                    data = await asyncio.wait_for(self.reader.readexactly(min(size, length)), ASYNC_TIMEOUT)
+                    length -= len(data)
+                    yield data
+                await self.reader.readline()
+        elif 'Content-Length' in self.headers:
+            remaining = int(self.headers['Content-Length'])
+            while remaining:
+                data = await self.read_chunk(min(size, remaining))
+                if not data:
+                    raise asyncio.IncompleteReadError(b'', remaining)
+                remaining -= len(data)
+                yield data
+        else:
+            self.keep_alive = False
+            while True:
+                data = await self.read_chunk(size)
+                if not data:
+                    break
+                yield data
+        self.complete = True
+    
+    async def read(self) -> bytes:
+        return b''.join([chunk async for chunk in self.iter_chunks()])
+    
+    def release(self):
+        if self.writer is None:
+            return
+        if self.complete and self.keep_alive:
+            self.client.idle.setdefault(self.key, []).append((self.reader, self.writer))
+        else:
+            self.writer.close()
+        self.writer = None
+        self.semaphore.release()
+
+class AsyncHttpClient:
+    # Мінімальний HTTP/1.1 клієнт на asyncio-потоках з keep-alive пулом на кожен хост
+    def __init__(self, connections_per_host: int = ASYNC_CONNECTIONS_PER_HOST):
+        self.connections_per_host = connections_per_host
+        self.idle: Dict[tuple, list] = {}
+        self.semaphores: Dict[tuple, asyncio.Semaphore] = {}
+        self.opened = self.reused = 0
+    
+    async def connect(self, key):
+        while self.idle.get(key):
+            reader, writer = self.idle[key].pop()
+            if not reader.at_eof() and not writer.is_closing():
+                self.reused += 1
+                return reader, writer, True
+            writer.close()
+        scheme, host, port = key
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=scheme == 'https' or None), ASYNC_TIMEOUT
+        )
+        self.opened += 1
+        return reader, writer, False
+    
+    async def request(self, method: str, url: str, headers: Optional[Dict] = None) -> AsyncResponse:
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        semaphore = self.semaphores.setdefault(key, asyncio.Semaphore(self.connections_per_host))
+        target = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        lines = [
+            f"{method} {target} HTTP/1.1",
+            f"Host: {parts.netloc}",
+            "Connection: keep-alive",
+            "Accept-Encoding: identity",
+            f"User-Agent: QQQ-Launcher/{VERSION}",
+        ]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        payload = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+        
+        await semaphore.acquire()
+        writer = None
+        try:
+            # Сервер міг закрити простоюване з'єднання — тоді одна спроба з новим
+            for attempt in range(2):
+                reader, writer, reused = await self.connect(key)
+                try:
+                    writer.write(payload)
+                    await writer.drain()
+                    status_line = await asyncio.wait_for(reader.readline(), ASYNC_TIMEOUT)
+                    if not status_line:
+                        raise ConnectionResetError("Connection closed by server")
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                break
+            
+            fields = status_line.split()
+            if len(fields) < 2 or not fields[1].isdigit():
+                raise ValueError(f"Malformed status line: {status_line[:100]!r}")
+            status = int(fields[1])
+            response_headers = CaseInsensitiveDict()
+            while True:
+                line = await asyncio.wait_for(reader.readline(), ASYNC_TIMEOUT)
+                if not line.strip():
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                response_headers[name.strip()] = value.strip()
+            return AsyncResponse(self, key, reader, writer, status, response_headers, semaphore)
+        except BaseException:
+            # Тайм-аут чи зіпсована відповідь: з'єднання в невідомому стані, у пул не повертаємо
+            if writer is not None:
+                writer.close()
+            semaphore.release()
+            raise
+    
+    async def close(self):
+        for connections in self.idle.values():
+            for _, writer in connections:
+                writer.close()
+        self.idle.clear()
+
+class TokenBucket:
+    # Спільний для всіх потоків ліміт швидкості: споживач чекає, доки в кошику
+    # накопичиться його порція. Поки чекає пріоритетна смуга, звичайна не отримує токенів
+    def __init__(self, rate: int = 0, burst: Optional[int] = None):
+        self.condition = threading.Condition()
+        self.priority_waiting = 0
+        self.configure(rate, burst)
+    
+    def configure(self, rate: int, burst: Optional[int] = None):
+        with self.condition:
+            self.rate = rate
+            self.capacity = burst or max(rate // 10, DOWNLOAD_CHUNK_SIZE)
+            self.tokens = 0
+            self.stamp = time.monotonic()
+            self.condition.notify_all()
+    
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+    
+    def consume(self, amount: int, priority: bool = False):
+        if not self.rate:
+            return
+        with self.condition:
+            if priority:
+                self.priority_waiting += 1
+            try:
+                while True:
+                    self.refill()
+                    needed = min(amount, self.capacity)
+                    if self.tokens >= needed and (priority or not self.priority_waiting):
+                        self.tokens -= amount
+                        return
+                    deficit = max(needed - self.tokens, 1) / self.rate
+                    self.condition.wait(min(deficit, SCHEDULER_INTERVAL))
+            finally:
+                if priority:
+                    self.priority_waiting -= 1
+                    self.condition.notify_all()
+
+class ProgressMeter:
+    # Кожен потік пише лише у власний лічильник, тож блокування на кожен файл чи
+    # блок не потрібне. Потік-семплер раз на інтервал підсумовує лічильники і
+    # надсилає рівно одну подію прогресу зі швидкістю та оцінкою часу
+    DONE, IN_FLIGHT, RECEIVED = range(3)
+    
+    def __init__(self, interval: float = PROGRESS_INTERVAL):
+        self.interval = interval
+        self.local = threading.local()
+        self.counters = []
+        self.lock = threading.Lock()  # Лише для реєстрації нового лічильника
+        self.generation = 0
+        self.received_before = 0
+        self.total = 0
+        self.callback = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.reported = 0
+        self.rate = None
+        self.sample = (time.monotonic(), 0)
+    
+    def counter(self) -> list:
+        local = self.local
+        if getattr(local, 'generation', None) != self.generation:
+            local.counter = [0, 0, 0]
+            local.generation = self.generation
+            with self.lock:
+                self.counters.append(local.counter)
+        return local.counter
+    
+    def add_done(self, size: int):
+        self.counter()[self.DONE] += size
+    
+    def add_received(self, size: int, in_flight: bool = True):
+        counter = self.counter()
+        if in_flight:
+            counter[self.IN_FLIGHT] += size
+        counter[self.RECEIVED] += size
+    
+    def in_flight(self) -> int:
+        return self.counter()[self.IN_FLIGHT]
+    
+    def settle(self, size: int):
+        # Отримані байти файлу зараховуються цілим файлом через add_done
+        self.counter()[self.IN_FLIGHT] -= size
+    
+    def total_of(self, slot: int) -> int:
+        return sum(counter[slot] for counter in list(self.counters))
+    
+    @property
+    def received(self) -> int:
+        return self.received_before + self.total_of(self.RECEIVED)
+    
+    def start(self, total: int, callback=None):
+        with self.lock:
+            self.received_before += sum(counter[self.RECEIVED] for counter in self.counters)
+            self.counters = []
+            self.generation += 1
+        self.total = total
+        self.callback = callback
+        self.reported = 0
+        self.rate = None
+        self.sample = (time.monotonic(), self.received)
+        self.stop_event.clear()
+        if callback:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+    
+    def stop(self):
+        if self.thread:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+            self.tick()
+    
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.tick()
+    
+    def tick(self):
+        now, received = time.monotonic(), self.received
+        last_time, last_received = self.sample
+        self.sample = (now, received)
+        if now > last_time:
+            speed = (received - last_received) / (now - last_time)
+            self.rate = speed if self.rate is None else 0.7 * self.rate + 0.3 * speed
+        
+        done = self.total_of(self.DONE) + self.total_of(self.IN_FLIGHT)
+        # Повтори після обриву можуть на мить дати більше, ніж є насправді
+        self.reported = max(self.reported, min(done, self.total))
+        remaining = self.total - self.reported
+        eta = remaining / self.rate if self.rate else None
+        percent = self.reported / self.total * 100 if self.total else 100
+        self.callback(percent, '', 'progress', {
+            'done': self.reported,
+            'total': self.total,
+            'bytes_per_second': round(self.rate or 0),
+            'eta': round(eta, 1) if eta is not None else None,
+        })
+
+class LimitedReader:
+    # Обгортка над потоком відповіді, що бере токени за кожне прочитане
+    # і рахує отримані байти в прогресі
+    def __init__(self, raw, limiter: TokenBucket, priority: bool = False,
+                 progress: Optional[ProgressMeter] = None):
+        self.raw = raw
+        self.limiter = limiter
+        self.priority = priority
+        self.progress = progress
+    
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.limiter.consume(len(data), self.priority)
+        if self.progress:
+            # Стиснуті байти архіву йдуть лише у швидкість, файли зараховуються цілими
+            self.progress.add_received(len(data), in_flight=False)
+        return data
+    
+    def tell(self):
+        return self.raw.tell()
+
+def backoff_delay(attempt: int) -> float:
+    # Експоненційна пауза з випадковим розкидом, щоб клієнти не поверталися одночасно
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+    return random.uniform(delay / 2, delay)
+
+class MirrorSet:
+    # Дзеркала сервера модпаків. Порядок задає конфігурація, після перевірки
+    # здоров'я — затримка відповіді; дзеркало, що підвело, йде в кінець
+    def __init__(self, urls):
+        self.urls = [url.rstrip('/') for url in urls]
+        self.latency: Dict[str, Optional[float]] = {}
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+    
+    def ordered(self) -> list:
+        with self.lock:
+            return list(self.urls)
+    
+    def demote(self, url: str):
+        with self.lock:
+            for mirror in self.urls:
+                if url.startswith(mirror) and mirror != self.urls[-1]:
+                    self.urls.remove(mirror)
+                    self.urls.append(mirror)
+                    self.logger.warning(f"Mirror {mirror} demoted")
+                    break
+    
+    def check(self, session, url: str) -> Optional[float]:
+        try:
+            start = time.perf_counter()
+            # Досить заголовків: тіло (корінь віддає маніфест) не читаємо
+            with session.get(f"{url}/", timeout=MIRROR_PROBE_TIMEOUT, stream=True) as r:
+                if r.status_code < 500:
+                    return time.perf_counter() - start
+        except requests.RequestException:
+            pass
+        return None
+    
+    def probe(self, session):
+        # Паралельна перевірка всіх дзеркал: здорові за зростанням затримки, решта в кінці
+        urls = self.ordered()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(urls)) as executor:
+            latency = dict(zip(urls, executor.map(lambda url: self.check(session, url), urls)))
+        with self.lock:
+            self.latency = latency
+            self.urls.sort(key=lambda url: (latency.get(url) is None, latency.get(url) or 0))
+        self.logger.info(
+            "Mirrors: " + ", ".join(
+                f"{url} ({latency[url] * 1000:.0f} ms)" if latency.get(url) is not None else f"{url} (down)"
+                for url in self.urls
+            )
+        )
+    
+    def rebase(self, url: str, source: str) -> list:
+        # Той самий файл на всіх дзеркалах у поточному порядку, якщо адресу видало одне з них
+        if not url.startswith(source):
+            return [url]
+        return [mirror + url[len(source):] for mirror in self.ordered()]
+
+class MetadataCache:
+    # Метадані версій (маніфест Mojang, промоції Forge, лоадери Fabric) на диску.
+    # Свіжий запис віддаємо без мережі, прострочений перевіряємо умовним запитом,
+    # а якщо мережі немає — віддаємо те, що є
+    def __init__(self, root: Path, session):
+        self.root = root
+        self.session = session
+        self.logger = logging.getLogger(__name__)
+    
+    def entry_path(self, url: str) -> Path:
+        return self.root / f"{hashlib.sha256(url.encode()).hexdigest()[:32]}.json"
+    
+    def load(self, url: str) -> Optional[Dict]:
+        try:
+            with open(self.entry_path(url), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            return entry if entry.get('url') == url else None
+        except (OSError, ValueError):
+            return None
+    
+    def store(self, entry: Dict):
+        try:
+            atomic_write_json(self.entry_path(entry['url']), entry, ensure_ascii=False)
+        except OSError as e:
+            self.logger.warning(f"Failed to cache metadata of {entry['url']}: {e}")
+    
+    def get(self, url: str, ttl: float = METADATA_TTL) -> str:
+        entry = self.load(url)
+        if entry and time.time() - entry['fetched'] < ttl:
+            return entry['body']
+        
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        try:
+            r = self.session.get(url, headers=headers, timeout=METADATA_TIMEOUT)
+            if r.status_code == 304 and entry:
+                entry['fetched'] = time.time()
+            else:
+                r.raise_for_status()
+                entry = {
+                    'url': url,
+                    'etag': r.headers.get('ETag'),
+                    'last_modified': r.headers.get('Last-Modified'),
+                    'fetched': time.time(),
+                    'body': r.text,
+                }
+            self.store(entry)
+        except requests.RequestException as e:
+            if not entry:
+                raise
+            self.logger.warning(f"Metadata {url} is unavailable, using cached copy: {e}")
+        return entry['body']
+    
+    def get_json(self, url: str, ttl: float = METADATA_TTL):
+        return json.loads(self.get(url, ttl))
+
+class PooledAdapter(HTTPAdapter):
+    def __init__(self, pool_size: int):
+        super().__init__(pool_connections=4, pool_maxsize=pool_size, pool_block=True)
+    
+    def connection_stats(self) -> Tuple[int, int]:
+        # urllib3 рахує нові з'єднання і запити для кожного пулу окремо
+        opened = requests_sent = 0
+        pools = self.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+                requests_sent += pool.num_requests
+        return opened, max(requests_sent - opened, 0)
+
 class ModpacksManager:
-    def __init__(self, path_manager):
+    def __init__(self, path_manager, workers: int = DOWNLOAD_MAX_WORKERS):
         self.path_manager = path_manager
         self.data_manager = DataManager(self.path_manager)
         self.logger = logging.getLogger(__name__)
+        self.scheduler_options = {'max_workers': workers}
+        self.adapter = PooledAdapter(workers)
         self.session = requests.Session()
-        self.total = self.done = 0
-        self.done_lock = threading.Lock()  # Для безпечного оновлення лічильника
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.progress = ProgressMeter()
+        self.deferred_lock = threading.Lock()
+        self.failures = []
+        self.plans: Dict[str, SyncPlan] = {}  # Плани, показані гравцеві до запуску
+        # plan() нічого не пише в поля менеджера, а execute() виставляє їх із плану,
+        # тож одночасно виконується лише одне з них
+        self.sync_lock = threading.RLock()
+        self.index = None
+        self.snapshot = None
+        self.store = ObjectStore(self.path_manager.get_objects_dir())
+        self.deep_verify = False
+        self.bundle_path = None
+        self.deferred = {}  # Дрібні файли, що підуть одним архівом
+        self.prefetched = {}  # Маніфести, отримані під час check_modpack_exists
+        self.engine = 'threads'  # або 'asyncio'
+        self.limiter = TokenBucket()
+        self.priority_limit = PRIORITY_FILE_LIMIT  # 0 вимикає пріоритетну смугу
+        self.loop = None  # Цикл подій WebSocketManager для asyncio-рушія
+        self.disk_executor = None
+        self.async_locks = {}
+        self.algorithm = DEFAULT_CHECKSUM_ALGORITHM
+        self.assets_url = ASSETS_URL
+        self.metadata = MetadataCache(self.path_manager.get_metadata_dir(), self.session)
         
-        self.url = MODPACKS_URL #config.get("modpacks-url", "").rstrip('/')
-        #if not self.url:
-            #raise ValueError("Не знайдено URL для модпаків")
+        self.mirrors = MirrorSet(MODPACKS_URLS)
+        self.source = self.mirrors.ordered()[0]  # Дзеркало, що віддало маніфест
+    
+    @property
+    def transferred(self) -> int:
+        # Байти, фактично отримані з мережі
+        return self.progress.received
     
-    def md5(self, path):
+    def file_checksum(self, path):
         try:
-            with open(path, 'rb') as f:
-                return hashlib.md5(f.read()).hexdigest()
-        except:
+            return Hasher.file_digest(path, self.algorithm)
+        except OSError as e:
+            self.logger.warning(f"Cannot hash {path}: {e}")
             return None
     
-    def get_dir_size(self, dir_path):
-        if not dir_path.exists():
-            return 0
-        return sum(f.stat().st_size for f in dir_path.rglob('*') if f.is_file())
+    def local_checksum(self, path, local, st):
+        # Якщо розмір, mtime та inode не змінились, довіряємо збереженій сумі
+        if not self.deep_verify:
+            cached = self.index.lookup(path, st, self.algorithm)
+            if cached:
+                return cached
+        checksum = self.file_checksum(local)
+        if checksum:
+            self.index.update(path, st, checksum, self.algorithm)
+        return checksum
     
     def collect_files(self, items, path=''):
         files = {}
@@ -332,153 +1471,1104 @@ class ModpacksManager:
                 files.update(self.collect_files(item['children'], p))
         return files
     
-    def download(self, path, info, callback=None):
+    def needs_fetch(self, path, info) -> bool:
+        st = self.snapshot.files.get(path)
+        if st is None:
+            return True
+        if info.get('sync', False):
+            if (st.st_size == info['size'] and 
+                self.local_checksum(path, self.target_dir / path, st) == info['checksum']):
+                self.progress.add_done(info['size'])
+                return False
+            return True
+        self.progress.add_done(info['size'])
+        return False
+    
+    def file_urls(self, info) -> list:
+        url = f"{self.base_url}/public/{self.target + '/' if self.target else ''}{info['url']}"
+        return self.mirrors.rebase(url, self.source)
+    
+    def failover(self, urls: list, error: Exception, attempt: int) -> float:
+        # Після 5xx, тайм-ауту чи обриву з'єднання дзеркало йде в кінець списку
+        # для всіх наступних запитів. Відповідь 4xx означає лише, що цього файлу
+        # там немає: дзеркало для файлу більше не пробуємо, але не понижуємо.
+        # Повертає паузу перед наступною спробою
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+        url = urls.pop(0)
+        if status is None or status >= 500:
+            self.mirrors.demote(url)
+            urls.append(url)
+        if not urls or attempt >= DOWNLOAD_RETRIES + len(self.mirrors.urls) - 1:
+            raise DownloadError(url, attempt, error) from error
+        self.logger.warning(f"Request to {url} failed (attempt {attempt}): {error}")
+        return backoff_delay(attempt)
+    
+    def defer_to_bundle(self, path, info) -> bool:
+        if self.bundle_path and info['size'] <= BUNDLE_FILE_LIMIT:
+            with self.deferred_lock:
+                self.deferred[path] = info
+            return True
+        return False
+    
+    def finish_file(self, path, info):
+        # Кожен унікальний файл качаємо один раз у сховище, а в інстанс ставимо посилання.
+        # Несинхронізовані файли гравець може змінювати, тож для них лише копія
+        local = self.target_dir / path
+        local.parent.mkdir(parents=True, exist_ok=True)
+        self.store.materialize(info, local, link=info.get('sync', False))
+        self.index.update(path, local.stat(), info['checksum'], self.algorithm)
+        self.progress.add_done(info['size'])
+    
+    def download(self, path, info):
+        try:
+            if not self.needs_fetch(path, info):
+                return True
+        except Exception as e:
+            self.record_failure(path, info, e)
+            return False
+        return self.fetch_file(path, info)
+    
+    def fetch_file(self, path, info):
+        try:
+            with self.store.lock_for(info['checksum']):
+                if self.store.has(info):
+                    self.store.count('deduplicated', info['size'])
+                elif self.defer_to_bundle(path, info):
+                    return True
+                else:
+                    obj = self.store.object_path(info['checksum'])
+                    obj.parent.mkdir(parents=True, exist_ok=True)
+                    self.fetch_to_file(self.session, self.file_urls(info), obj, info)
+                    self.store.record(info)
+            self.finish_file(path, info)
+            return True
+                
+        except Exception as e:
+            self.record_failure(path, info, e)
+            return False
+    
+    def record_failure(self, path, info, error: Exception):
+        # Без діалогів: пул працює далі, а звіт показується один раз у кінці
+        cause = getattr(error, 'cause', error)
+        failure = FileFailure(
+            path=path,
+            url=getattr(error, 'url', None) or self.file_urls(info)[0],
+            error=type(cause).__name__,
+            message=str(cause),
+            attempts=getattr(error, 'attempts', 1),
+        )
+        self.logger.error(f"Download of {path} failed: {failure.error}: {failure.message}")
+        with self.deferred_lock:
+            self.failures.append(failure)
+    
+    def make_bundles(self, files: Dict[str, Dict]) -> list:
+        bundles, current, current_size = [], {}, 0
+        for path, info in files.items():
+            if current and (len(current) >= BUNDLE_MAX_FILES or
+                            current_size + info['size'] > BUNDLE_MAX_BYTES):
+                bundles.append(current)
+                current, current_size = {}, 0
+            current[path] = info
+            current_size += info['size']
+        if current:
+            bundles.append(current)
+        return bundles
+    
+    def fetch_bundle(self, batch: Dict[str, Dict]) -> Dict[str, Dict]:
+        # Один запит на групу дрібних файлів: сервер віддає tar.gz, кожен член
+        # перевіряється за сумою з маніфесту. Повертає файли, які не прийшли
+        remaining = {info['url']: (path, info) for path, info in batch.items()}
+        url = f"{self.base_url}/{self.bundle_path}/{self.target}"
         try:
-            local = self.target_dir / path
+            with self.session.post(url, json={'files': list(remaining)}, stream=True, timeout=30) as r:
+                if r.status_code != 200:
+                    raise requests.RequestException(f"HTTP {r.status_code}")
+                # Група складається з дрібних файлів, тож іде пріоритетною смугою
+                raw = LimitedReader(r.raw, self.limiter, bool(self.priority_limit), self.progress)
+                with tarfile.open(fileobj=raw, mode='r|gz') as tar:
+                    for member in tar:
+                        entry = remaining.get(member.name)
+                        if entry is None or not member.isfile():
+                            continue
+                        path, info = entry
+                        data = tar.extractfile(member).read()
+                        if len(data) != info['size'] or Hasher.digest(data, self.algorithm) != info['checksum']:
+                            self.logger.warning(f"Bundle member {member.name} does not match the manifest")
+                            continue
+                        local = self.target_dir / path
+                        local.parent.mkdir(parents=True, exist_ok=True)
+                        with self.store.lock_for(info['checksum']):
+                            self.store.put(info, data)
+                        self.store.materialize(info, local, link=info.get('sync', False))
+                        self.index.update(path, local.stat(), info['checksum'], self.algorithm)
+                        del remaining[member.name]
+                        self.progress.add_done(info['size'])
+        except (requests.RequestException, tarfile.TarError, OSError) as e:
+            self.logger.warning(f"Bundle of {len(batch)} files failed, falling back to single files: {e}")
+        return dict(remaining.values())
+    
+    def run_async(self, files: Dict[str, Dict]) -> int:
+        # Запускаємо на спільному циклі подій лаунчера, якщо він працює
+        coro = self.download_all_async(files)
+        if self.loop and self.loop.is_running():
+            return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+        return asyncio.run(coro)
+    
+    async def download_all_async(self, files: Dict[str, Dict]) -> int:
+        if self.disk_executor is None:
+            self.disk_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=ASYNC_DISK_WORKERS, thread_name_prefix='disk'
+            )
+        client = AsyncHttpClient()
+        semaphore = asyncio.Semaphore(ASYNC_CONCURRENCY)
+        self.async_locks = {}
+        
+        async def run_one(path, info):
+            async with semaphore:
+                return await self.download_async(client, path, info)
+        
+        ordered = sorted(files.items(), key=lambda item: -item[1]['size'])
+        try:
+            results = await asyncio.gather(*(run_one(path, info) for path, info in ordered))
+        finally:
+            await client.close()
+        self.logger.info(f"Async HTTP connections: {client.opened} opened, {client.reused} reused")
+        return results.count(False)
+    
+    async def download_async(self, client, path, info) -> bool:
+        loop = asyncio.get_running_loop()
+        disk = lambda fn, *args: loop.run_in_executor(self.disk_executor, fn, *args)
+        try:
+            if not await disk(self.needs_fetch, path, info):
+                return True
             
-            if not local.exists():
-                pass
-            elif info.get('sync', False):
-                if (local.stat().st_size == info['size'] and 
-                    self.md5(local) == info['checksum']):
-                    with self.done_lock:
-                        self.done += info['size']
-                        current_progress = self.done / self.total * 100
-                    if callback:
-                        callback(current_progress, path, 'skipped')
-                    return
+            lock = self.async_locks.setdefault(info['checksum'], asyncio.Lock())
+            async with lock:
+                if await disk(self.store.has, info):
+                    self.store.count('deduplicated', info['size'])
+                elif self.defer_to_bundle(path, info):
+                    return True
+                else:
+                    obj = self.store.object_path(info['checksum'])
+                    await self.fetch_to_file_async(client, self.file_urls(info), obj, info)
+                    await disk(self.store.record, info)
+            await disk(self.finish_file, path, info)
+            return True
+        
+        except Exception as e:
+            self.record_failure(path, info, e)
+            return False
+    
+    async def fetch_to_file_async(self, client, urls, local, info):
+        loop = asyncio.get_running_loop()
+        disk = lambda fn, *args: loop.run_in_executor(self.disk_executor, fn, *args)
+        await disk(lambda: local.parent.mkdir(parents=True, exist_ok=True))
+        part, meta, offset, hasher = await disk(self.prepare_partial, local, info)
+        priority = info['size'] <= self.priority_limit
+        urls = list(urls)
+        received = 0
+        try:
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    headers = {'Range': f'bytes={offset}-'} if offset else {}
+                    async with await client.request('GET', urls[0], headers) as r:
+                        if r.status_code == 206 and self.range_start(r) == offset:
+                            mode = 'ab'
+                        elif r.status_code == 200:
+                            mode, offset, hasher = 'wb', 0, self.new_hasher(info)
+                        elif r.status_code == 416:
+                            await r.read()
+                            break
+                        else:
+                            raise requests.HTTPError(f"HTTP {r.status_code}", response=r)
+                    
+                        f = await disk(open, part, mode)
+                        try:
+                            async for chunk in r.iter_chunks(PART_CHUNK_SIZE):
+                                if self.limiter.rate:
+                                    await loop.run_in_executor(None, self.limiter.consume, len(chunk), priority)
+                                hasher.update(chunk)
+                                await disk(f.write, chunk)
+                                offset += len(chunk)
+                                received += len(chunk)
+                                self.progress.add_received(len(chunk))
+                        finally:
+                            await disk(f.close)
+                    if offset >= info['size']:
+                        break
+                    raise ConnectionError(f"Incomplete body: {offset}/{info['size']} bytes")
+                except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError,
+                        requests.HTTPError) as e:
+                    # OSError охоплює gaierror, SSLError та обриви з'єднання — те, що
+                    # у потоковому рушії requests загортає в ConnectionError
+                    await asyncio.sleep(self.failover(urls, e, attempt))
+                    part, meta, offset, hasher = await disk(self.prepare_partial, local, info)
+        finally:
+            # Отримані байти далі рахуються цілим файлом
+            self.progress.settle(received)
+        
+        await disk(self.finish_partial, urls[0], local, part, meta, offset, hasher, info)
+    
+    def new_hasher(self, info):
+        # Файли не з маніфесту модпака (ванільні бібліотеки та ресурси) мають власний алгоритм
+        return Hasher.new(info.get('algorithm', self.algorithm))
+    
+    def prepare_partial(self, local, info):
+        # Пишемо частинами у тимчасовий файл поруч і атомарно підміняємо ним цільовий,
+        # щоб гра ніколи не побачила недописаний файл. Недокачаний .part лишається
+        # на диску разом із записом про очікуваний файл і докачується через Range
+        part = local.with_name(local.name + PARTIAL_SUFFIX)
+        meta = local.with_name(local.name + PARTIAL_META_SUFFIX)
+        expected = {'size': info['size'], 'checksum': info['checksum']}
+        
+        hasher = self.new_hasher(info)
+        offset = 0
+        if part.exists() and self.read_partial_meta(meta) == expected:
+            offset = part.stat().st_size
+            if offset <= info['size']:
+                with open(part, 'rb') as f:
+                    for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                        hasher.update(chunk)
             else:
-                with self.done_lock:
-                    self.done += info['size']
-                    current_progress = self.done / self.total * 100
-                if callback:
-                    callback(current_progress, path, 'skipped')
-                return
-            
-            local.parent.mkdir(parents=True, exist_ok=True)
-            file_url = f"{self.base_url}/public/{self.target + '/' if self.target else ''}{info['url']}"
-            
-            # Створюємо окрему сесію для кожного потоку
-            session = requests.Session()
-            r = session.get(file_url, timeout=30)
-            
-            if r.status_code == 200:
-                local.write_bytes(r.content)
-                with self.done_lock:
-                    self.done += info['size']
-                    current_progress = self.done / self.total * 100
-                if callback:
-                    callback(current_progress, path, 'downloaded')
+                offset = 0
+        if not offset:
+            part.unlink(missing_ok=True)
+            with open(meta, 'w', encoding='utf-8') as f:
+                json.dump(expected, f)
+        return part, meta, offset, hasher
+    
+    def finish_partial(self, url, local, part, meta, offset, hasher, info):
+        if offset < info['size']:
+            raise requests.ConnectionError(f"Недокачано {offset}/{info['size']} байт: {url}")
+        if offset != info['size'] or hasher.hexdigest() != info['checksum']:
+            part.unlink(missing_ok=True)
+            meta.unlink(missing_ok=True)
+            raise requests.RequestException(
+                f"Файл пошкоджено: {offset}/{info['size']} байт, контрольна сума не збігається"
+            )
+        os.replace(part, local)
+        meta.unlink(missing_ok=True)
+    
+    def fetch_to_file(self, session, urls, local, info):
+        # Докачуємо з того ж місця, а після збою переходимо на наступне дзеркало
+        part, meta, offset, hasher = self.prepare_partial(local, info)
+        urls = list(urls)
+        in_flight = self.progress.in_flight()
+        try:
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    offset, hasher = self.fetch_range(session, urls[0], part, offset, hasher, info)
+                    if offset >= info['size']:
+                        break
+                    raise requests.ConnectionError(f"Incomplete body: {offset}/{info['size']} bytes")
+                except (requests.ConnectionError, requests.Timeout, requests.HTTPError,
+                        requests.exceptions.ChunkedEncodingError) as e:
+                    time.sleep(self.failover(urls, e, attempt))
+                    part, meta, offset, hasher = self.prepare_partial(local, info)
+        finally:
+            self.progress.settle(self.progress.in_flight() - in_flight)
+        
+        self.finish_partial(urls[0], local, part, meta, offset, hasher, info)
+    
+    def fetch_range(self, session, url, part, offset, hasher, info):
+        priority = info['size'] <= self.priority_limit
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+        with session.get(url, headers=headers, stream=True, timeout=30) as r:
+            if r.status_code == 206 and self.range_start(r) == offset:
+                mode = 'ab'
+            elif r.status_code == 200:
+                # Сервер проігнорував Range — качаємо файл заново
+                mode, offset, hasher = 'wb', 0, self.new_hasher(info)
+            elif r.status_code == 416:
+                return offset, hasher
             else:
-                raise requests.RequestException(f"HTTP {r.status_code}")
-                
-        except Exception as e:
-            ErrorHandler.show_error_dialog(f"Помилка завантаження {path}", str(e))
+                raise requests.HTTPError(f"HTTP {r.status_code}", response=r)
+            
+            with open(part, mode) as f:
+                for chunk in r.iter_content(PART_CHUNK_SIZE):
+                    self.limiter.consume(len(chunk), priority)
+                    f.write(chunk)
+                    hasher.update(chunk)
+                    offset += len(chunk)
+                    self.progress.add_received(len(chunk))
+        return offset, hasher
+    
+    @staticmethod
+    def range_start(response) -> Optional[int]:
+        match = re.match(r'bytes (\d+)-', response.headers.get('Content-Range', ''))
+        return int(match.group(1)) if match else None
     
-    def process_files(self, items, path=''):
+    @staticmethod
+    def read_partial_meta(meta: Path) -> Optional[Dict]:
+        try:
+            with open(meta, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    @staticmethod
+    def partial_target(rel_path: str) -> str:
+        for suffix in (PARTIAL_META_SUFFIX, PARTIAL_SUFFIX):
+            if rel_path.endswith(suffix):
+                return rel_path[:-len(suffix)]
+        return rel_path
+    
+    def process_files(self, plan: SyncPlan, items, path='') -> Tuple[Dict, int]:
+        # Повертає файли для перевірки та розмір папок, що збігаються цілком
         files_to_download = {}
+        skipped = 0
         
         for item in items:
             current_path = f"{path}/{item['name']}" if path else item['name']
             
             if item['type'] == 'dir':
-                local_dir = self.target_dir / current_path
-                
-                if (local_dir.exists() and 
-                    self.get_dir_size(local_dir) == item['size']):
-                    
-                    for child in item.get('children', []):
-                        if child['type'] == 'file':
-                            with self.done_lock:
-                                self.done += child['size']
+                if plan.snapshot.dir_size(current_path) == item['size']:
+                    skipped += item['size']
                     continue
                 
                 if 'children' in item:
-                    child_files = self.process_files(item['children'], current_path)
+                    child_files, child_skipped = self.process_files(plan, item['children'], current_path)
                     files_to_download.update(child_files)
+                    skipped += child_skipped
             else:
                 files_to_download[current_path] = item
         
-        return files_to_download
+        return files_to_download, skipped
+    
+    @staticmethod
+    def sync_dirs(server_files) -> set:
+        # Усі папки, в яких (на будь-якій глибині) є синхронізовані файли.
+        # Корінь інстансу сюди не входить — там лежать options.txt, servers.dat тощо
+        dirs = set()
+        for path, info in server_files.items():
+            if not info.get('sync', False):
+                continue
+            parts = path.split('/')[:-1]
+            for depth in range(len(parts), 0, -1):
+                ancestor = '/'.join(parts[:depth])
+                if ancestor in dirs:
+                    break
+                dirs.add(ancestor)
+        return dirs
     
-    def cleanup_sync_files(self, server_files):
-        if not self.target_dir.exists():
+    def find_orphans(self, local_paths, server_files) -> list:
+        sync_dirs = self.sync_dirs(server_files)
+        orphans = []
+        for rel_path in local_paths:
+            # Недокачані файли з маніфесту лишаємо для докачування
+            if self.partial_target(rel_path) in server_files:
+                continue
+            if rel_path.rpartition('/')[0] in sync_dirs:
+                orphans.append(rel_path)
+        return orphans
+    
+    def cleanup_sync_files(self, orphans):
+        for rel_path in orphans:
+            (self.target_dir / rel_path).unlink(missing_ok=True)
+    
+    def load_last_manifest(self, instance: str) -> Dict:
+        path = self.path_manager.get_manifest_path(instance)
+        try:
+            if path.exists():
+                with open(path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            self.logger.warning(f"Saved manifest {path} is unreadable: {e}")
+        return {}
+    
+    def save_last_manifest(self, instance: str, fetched: Dict):
+        path = self.path_manager.get_manifest_path(instance)
+        try:
+            atomic_write_json(path, fetched, ensure_ascii=False)
+        except Exception as e:
+            self.logger.error(f"Failed to save manifest {path}: {e}")
+    
+    def referenced_objects(self) -> Optional[set]:
+        # Об'єкти, на які посилаються збережені маніфести всіх інстансів. Несинхронізовані
+        # файли лежать в інстансі копією, тож у сховищі для них нічого не тримаємо.
+        # None — якщо якийсь маніфест не прочитався і певності немає
+        keep = set()
+        for path in self.path_manager.get_manifests_dir().glob("*.json"):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f).get('manifest') or {}
+                algorithm = manifest.get('checksum_algorithm', DEFAULT_CHECKSUM_ALGORITHM)
+                for info in self.collect_files(manifest.get('files', [])).values():
+                    if info.get('sync', False):
+                        keep.add(ObjectStore.object_name(info['checksum'], algorithm))
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                self.logger.warning(f"Saved manifest {path} is unreadable, skipping object pruning: {e}")
+                return None
+        return keep
+    
+    def prune_store(self):
+        keep = self.referenced_objects()
+        if keep is None:
             return
+        removed, freed = self.store.prune(keep)
+        self.store.save()
+        if removed:
+            self.logger.info(f"Object store: pruned {removed} files, {freed} bytes freed")
+    
+    def fetch_manifest(self, modpack: str, instance: str, timeout: int = 30, retry: bool = True) -> Tuple[Dict, bool]:
+        # Умовний запит з ETag останньої успішної синхронізації. Якщо сервер
+        # не підтримує ETag, порівнюємо хеш тіла відповіді. Без retry кожне
+        # дзеркало пробуємо лише раз і без пауз
+        if modpack in self.prefetched:
+            return self.prefetched.pop(modpack)
         
-        sync_files = {path for path, info in server_files.items() if info.get('sync', False)}
+        last = self.load_last_manifest(instance)
+        query = f"?modpack={modpack}" if modpack else ''
         
-        for local_file in self.target_dir.rglob('*'):
-            if local_file.is_file():
-                rel_path = str(local_file.relative_to(self.target_dir)).replace('\\', '/')
-                
-                if rel_path not in server_files:
-                    parent_dir = '/'.join(rel_path.split('/')[:-1])
-                    if any(sync_file.startswith(parent_dir) for sync_file in sync_files):
-                        local_file.unlink()
+        mirrors = self.mirrors.ordered()
+        attempt = 0
+        while True:
+            attempt += 1
+            mirror = mirrors[0]
+            # ETag дійсний лише для дзеркала, яке його видало
+            headers = {'If-None-Match': last['etag']} if last.get('etag') and last.get('mirror') == mirror else {}
+            try:
+                r = self.session.get(f"{mirror}/{query}", headers=headers, timeout=timeout)
+                if r.status_code >= 500:
+                    raise requests.HTTPError(f"HTTP {r.status_code}", response=r)
+                manifest = None if r.status_code == 304 else r.json()
+                break
+            except (requests.RequestException, ValueError) as e:
+                if retry:
+                    time.sleep(self.failover(mirrors, e, attempt))
+                    continue
+                mirrors.pop(0)
+                if not mirrors:
+                    raise
+                self.logger.warning(f"Manifest request to {mirror} failed: {e}")
+        
+        if r.status_code == 304 and last.get('manifest'):
+            return last, True
+        
+        digest = hashlib.sha256(r.content).hexdigest()
+        fetched = {'etag': r.headers.get('ETag'), 'digest': digest, 'manifest': manifest, 'mirror': mirror}
+        return fetched, bool(last.get('manifest')) and digest == last.get('digest')
     
     def check_modpack_exists(self, modpack: str) -> bool:
+        # Інші помилки плану (скажімо, непідтримуваний алгоритм) покаже install_modpack
+        plan = self.plans.get(modpack)
+        if plan and time.monotonic() - plan.created < PLAN_TTL:
+            return (plan.fetched.get('manifest') or {}).get('status') == 'ok'
         try:
-            url = f"{self.url}/?modpack={modpack}"
-            response = self.session.get(url, timeout=10)
-            return response.json().get('status') == 'ok'
-        except:
+            fetched = self.fetch_manifest(modpack, modpack, timeout=10, retry=False)
+            if fetched[0]['manifest'].get('status') != 'ok':
+                return False
+            self.prefetched[modpack] = fetched
+            return True
+        except Exception:
             return False
     
-    def install_modpack(self, modpack='', target_dir='game', callback=None):
-        try:
-            self.target_dir = Path(target_dir)
-            self.target_dir.mkdir(parents=True, exist_ok=True)
-            
-            url = f"{self.url}/"
-            if modpack:
-                url += f"?modpack={modpack}"
-            
-            data = self.session.get(url, timeout=30).json()
-            if data.get('status') != 'ok':
-                error_msg = data.get('message', 'Невідома помилка')
-                if callback:
-                    callback(0, '', 'error', error_msg)
-                ErrorHandler.show_error_dialog("Помилка встановлення", error_msg)
+    def diff_manifest(self, old_items, new_items, path='') -> Tuple[Dict, Dict]:
+        # Однакові піддерева не обходимо: усі їхні файли одразу вважаємо незмінними
+        old_by_name = {item['name']: item for item in old_items}
+        changed, unchanged = {}, {}
+        for item in new_items:
+            current_path = f"{path}/{item['name']}" if path else item['name']
+            old = old_by_name.get(item['name'])
+            if old == item:
+                unchanged.update(self.collect_files([item], path))
+            elif item['type'] == 'dir' and old and old['type'] == 'dir':
+                sub_changed, sub_unchanged = self.diff_manifest(
+                    old.get('children', []), item.get('children', []), current_path
+                )
+                changed.update(sub_changed)
+                unchanged.update(sub_unchanged)
+            else:
+                changed.update(self.collect_files([item], path))
+        return changed, unchanged
+    
+    @staticmethod
+    def is_intact(plan: SyncPlan, path, info, st) -> bool:
+        if st is None:
+            return False
+        if not info.get('sync', False):
+            return True
+        return st.st_size == info['size'] and plan.index.lookup(path, st, plan.algorithm) == info['checksum']
+    
+    def quick_check(self, plan: SyncPlan) -> bool:
+        # Лише stat та перелік синхронізованих папок, без хешування
+        server_files = plan.files
+        for path, info in server_files.items():
+            try:
+                st = os.stat(plan.target_dir / path)
+            except OSError:
                 return False
-            
-            self.total = data['total_size']
-            self.target = data.get('target', '')
-            self.base_url = data.get('base_url', self.url)
-            self.done = 0  # Скидаємо лічильник
-            
-            all_files = self.collect_files(data['files'])
-            self.cleanup_sync_files(all_files)
-            
-            files_to_process = self.process_files(data['files'])
-            
-            # Паралельне завантаження з 10 потоками
-            with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-                # Створюємо список завдань для завантаження
-                future_to_file = {
-                    executor.submit(self.download, path, info, callback): path 
-                    for path, info in files_to_process.items()
-                }
-                
-                # Очікуємо завершення всіх завантажень
-                for future in concurrent.futures.as_completed(future_to_file):
-                    path = future_to_file[future]
-                    try:
-                        future.result()  # Отримуємо результат (або винятки)
-                    except Exception as exc:
-                        self.logger.error(f'Файл {path} згенерував виняток: {exc}')
-            
+            if not self.is_intact(plan, path, info, st):
+                return False
+        return not self.find_orphans(self.list_sync_files(plan.target_dir, server_files), server_files)
+    
+    def list_sync_files(self, target_dir: Path, server_files) -> list:
+        # Лише перелік синхронізованих папок: без stat і без обходу решти інстансу
+        files = []
+        for sync_dir in self.sync_dirs(server_files):
+            try:
+                with os.scandir(target_dir / sync_dir) as entries:
+                    files.extend(f"{sync_dir}/{entry.name}" for entry in entries if entry.is_file())
+            except OSError:
+                continue
+        return files
+    
+    def make_scheduler(self, callback=None) -> DownloadScheduler:
+        def on_stats(stats):
+            self.logger.debug(f"Scheduler: {stats}")
+            if callback:
+                callback(self.progress.reported / self.progress.total * 100 if self.progress.total else 100,
+                         '', 'scheduler', stats)
+        
+        return DownloadScheduler(lambda: self.transferred, on_stats, **self.scheduler_options)
+    
+    def run_scheduled(self, tasks, callback=None):
+        scheduler = self.make_scheduler(callback)
+        for size, fn, *args in tasks:
+            scheduler.submit(size, fn, *args)
+        scheduler.close()
+        scheduler.run()
+        return scheduler.errors
+    
+    def run_pipeline(self, fetch: Dict[str, Dict], verify: Dict[str, Dict], callback=None) -> int:
+        # Стадії: stat та індекс (їх уже пройшов план), хешування потоками за числом
+        # ядер і завантаження планувальником. Відсутні файли качаються одразу,
+        # а застарілі — щойно хеш не зійшовся, поки решта дерева ще перевіряється
+        scheduler = self.make_scheduler(callback)
+        for path, info in fetch.items():
+            scheduler.submit(info['size'], self.fetch_file, path, info)
+        
+        pending = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        errors = []
+        
+        def verify_worker():
+            while True:
+                item = pending.get()
+                if item is None:
+                    return
+                path, info = item
+                try:
+                    if self.needs_fetch(path, info):
+                        scheduler.submit(info['size'], self.fetch_file, path, info)
+                except Exception as e:
+                    self.record_failure(path, info, e)
+                    errors.append(path)
+        
+        def feed():
+            try:
+                # Великі файли першими, як і в черзі завантажень
+                for path, info in sorted(verify.items(), key=lambda item: -item[1]['size']):
+                    pending.put((path, info))
+            finally:
+                for _ in workers:
+                    pending.put(None)
+                for worker in workers:
+                    worker.join()
+                scheduler.close()
+        
+        workers = [threading.Thread(target=verify_worker, daemon=True)
+                   for _ in range(min(VERIFY_WORKERS, len(verify)))]
+        for worker in workers:
+            worker.start()
+        threading.Thread(target=feed, daemon=True).start()
+        scheduler.run()
+        return scheduler.errors + len(errors)
+    
+    def load_throughput(self) -> Optional[float]:
+        return self.data_manager.load("sync.json").get('bytes_per_second')
+    
+    def save_throughput(self, received: int, seconds: float):
+        # Згладжена швидкість останніх синхронізацій для оцінки часу в плані
+        if received < DOWNLOAD_CHUNK_SIZE or seconds <= 0:
+            return
+        rate = received / seconds
+        previous = self.load_throughput()
+        if previous:
+            rate = 0.5 * previous + 0.5 * rate
+        self.data_manager.save({'bytes_per_second': round(rate)}, "sync.json")
+    
+    def plan(self, modpack='', target_dir='game', deep_verify=False) -> SyncPlan:
+        # З мережі лише маніфест, решта — stat та індекс, без хешування і змін на диску.
+        # Усе знайдене лягає в план, поля менеджера не змінюються
+        with self.sync_lock:
+            return self.build_plan(modpack, Path(target_dir), deep_verify)
+    
+    def build_plan(self, modpack: str, target_dir: Path, deep_verify: bool) -> SyncPlan:
+        instance = target_dir.name
+        index = FileIndex(self.path_manager.get_index_path(instance))
+        plan = SyncPlan(modpack, target_dir, deep_verify=deep_verify, index=index)
+        
+        plan.fetched, not_modified = self.fetch_manifest(modpack, instance)
+        data = plan.fetched['manifest']
+        if data.get('status') != 'ok':
+            plan.error = data.get('message', 'Невідома помилка')
+            return plan
+        
+        plan.algorithm = data.get('checksum_algorithm', DEFAULT_CHECKSUM_ALGORITHM)
+        if not Hasher.supports(plan.algorithm):
+            plan.error = f"Алгоритм контрольних сум {plan.algorithm} не підтримується, оновіть лаунчер"
+            return plan
+        
+        plan.files = self.collect_files(data['files'])
+        plan.bytes_per_second = self.load_throughput()
+        
+        # Маніфест не змінився і файли на місці — планувати нічого
+        if not_modified and not deep_verify and self.quick_check(plan):
+            plan.up_to_date = True
+            plan.skipped = data['total_size']
+            return plan
+        
+        last_manifest = self.load_last_manifest(instance).get('manifest') or {}
+        if last_manifest.get('files') and not deep_verify:
+            # Спершу різниця з останнім успішним маніфестом: незмінні файли лише звіряємо
+            # за stat та індексом, а знімок і класифікацію робимо тільки для змінених
+            changed, unchanged = self.diff_manifest(last_manifest['files'], data['files'])
+            files_to_process = dict(changed)
+            for path, info in unchanged.items():
+                try:
+                    st = os.stat(target_dir / path)
+                except OSError:
+                    st = None
+                if self.is_intact(plan, path, info, st):
+                    plan.skipped += info['size']
+                else:
+                    files_to_process[path] = info
+            snapshot = plan.snapshot = TreeSnapshot(target_dir, files_to_process)
+            plan.delete = self.find_orphans(self.list_sync_files(target_dir, plan.files), plan.files)
+            self.logger.info(
+                f"Manifest diff: {len(changed)} changed, {len(unchanged)} unchanged files, "
+                f"{len(files_to_process) - len(changed)} unchanged files need a check"
+            )
+        else:
+            # Попереднього маніфесту немає або потрібна повна перевірка — обходимо все дерево
+            snapshot = plan.snapshot = TreeSnapshot(target_dir)
+            plan.delete = self.find_orphans(list(snapshot.files), plan.files)
+            for rel_path in plan.delete:
+                snapshot.remove(rel_path)
+            files_to_process, plan.skipped = self.process_files(plan, data['files'])
+        
+        # Відсутні файли та файли, чия сума в індексі вже не збігається, — качати;
+        # файли без запису в індексі — хешувати
+        for path, info in files_to_process.items():
+            st = snapshot.files.get(path)
+            known = index.lookup(path, st, plan.algorithm) if st is not None and not deep_verify else None
+            if st is None or (info.get('sync', False) and known is not None and known != info['checksum']):
+                plan.fetch[path] = info
+                if self.store.object_path(info['checksum'], plan.algorithm).exists():
+                    plan.stored += info['size']
+            elif info.get('sync', False) and (deep_verify or not self.is_intact(plan, path, info, st)):
+                plan.verify[path] = info
+            else:
+                plan.skipped += info['size']
+        return plan
+    
+    def prepare_plan(self, modpack='', target_dir='game') -> SyncPlan:
+        # План для показу гравцеві; запуск синхронізації виконає саме його
+        plan = self.plan(modpack, target_dir)
+        self.plans[plan.target_dir.name] = plan
+        return plan
+    
+    def take_plan(self, target_dir, deep_verify=False) -> Optional[SyncPlan]:
+        plan = self.plans.pop(Path(target_dir).name, None)
+        if plan is None or plan.deep_verify != deep_verify or time.monotonic() - plan.created > PLAN_TTL:
+            return None
+        return plan
+    
+    def install_modpack(self, modpack='', target_dir='game', callback=None, deep_verify=False, plan=None):
+        try:
+            with self.sync_lock:
+                plan = plan or self.take_plan(target_dir, deep_verify) or self.plan(modpack, target_dir, deep_verify)
+                if plan.error:
+                    if callback:
+                        callback(0, '', 'error', plan.error)
+                    return SyncReport(ok=False, error=plan.error)
+                return self.execute(plan, callback)
+        except Exception as e:
+            self.logger.error(f"Modpack sync failed: {e}")
+            return SyncReport(ok=False, error=str(e))
+        finally:
+            self.progress.stop()
+    
+    def execute(self, plan: SyncPlan, callback=None) -> SyncReport:
+        with self.sync_lock:
+            return self.run_plan(plan, callback)
+    
+    def run_plan(self, plan: SyncPlan, callback=None) -> SyncReport:
+        # Лічильники urllib3 накопичуються за весь час сесії, тож рахуємо різницю
+        opened_before, reused_before = self.adapter.connection_stats()
+        # Поля поточної синхронізації, з якими працюють потоки завантаження,
+        # беруться лише з плану
+        self.target_dir = plan.target_dir
+        self.target_dir.mkdir(parents=True, exist_ok=True)
+        self.index = plan.index
+        self.snapshot = plan.snapshot
+        self.deep_verify = plan.deep_verify
+        self.algorithm = self.store.algorithm = plan.algorithm
+        instance = self.target_dir.name
+        data = plan.fetched['manifest']
+        
+        self.source = plan.fetched.get('mirror') or self.source
+        self.target = data.get('target', '')
+        self.base_url = data.get('base_url', self.source).rstrip('/')
+        self.bundle_path = data.get('bundle')
+        self.deferred = {}
+        self.failures = []
+        self.store.reset_stats()
+        self.progress.start(data['total_size'], callback)
+        self.progress.add_done(plan.skipped)
+        
+        if plan.up_to_date:
+            self.logger.info(f"Manifest of {instance} is unchanged and files are intact, skipping sync")
+            self.progress.stop()
             if callback:
                 callback(100, '', 'complete', f"Майже готово")
+            return SyncReport(files=len(plan.files))
+        
+        self.cleanup_sync_files(plan.delete)
+        received, start = self.transferred, time.monotonic()
+        
+        # Найбільші файли йдуть першими, кількість потоків підбирає планувальник
+        if self.engine == 'asyncio':
+            errors = self.run_async({**plan.fetch, **plan.verify})
+        else:
+            errors = self.run_pipeline(plan.fetch, plan.verify, callback)
+        
+        # Дрібні файли, яких немає у сховищі, качаємо архівами,
+        # а те, що не прийшло в архіві, — поодинці
+        if self.deferred:
+            bundles = self.make_bundles(self.deferred)
+            self.deferred = {}
+            leftovers = {}
+            self.run_scheduled(
+                [(sum(i['size'] for i in batch.values()),
+                  lambda batch: leftovers.update(self.fetch_bundle(batch)), batch)
+                 for batch in bundles],
+                callback
+            )
+            self.bundle_path = None
+            errors += self.run_scheduled(
+                [(info['size'], self.download, path, info) for path, info in leftovers.items()],
+                callback
+            )
+            self.logger.info(
+                f"Bundled {sum(len(b) for b in bundles) - len(leftovers)} small files "
+                f"into {len(bundles)} requests"
+            )
+        self.save_throughput(self.transferred - received, time.monotonic() - start)
+        
+        self.index.prune(plan.files.keys())
+        self.index.save()
+        self.store.save()
+        if not errors:
+            self.save_last_manifest(instance, plan.fetched)
+            self.prune_store()
+        
+        stats = self.store.stats
+        self.logger.info(
+            f"Object store: {stats['fetched']} bytes fetched, {stats['deduplicated']} bytes deduplicated, "
+            f"{stats['linked']} bytes hardlinked, {stats['copied']} bytes copied"
+        )
+        opened, reused = self.adapter.connection_stats()
+        self.logger.info(
+            f"HTTP connections: {opened - opened_before} opened, {reused - reused_before} reused"
+        )
+        
+        self.progress.stop()
+        report = SyncReport(ok=not self.failures, files=len(plan.files), failures=list(self.failures))
+        if callback and report.ok:
+            callback(100, '', 'complete', f"Майже готово")
+        return report
+
+    @staticmethod
+    def rules_allow(rules) -> bool:
+        # Як у minecraft_launcher_lib: бібліотека потрібна, якщо дозволяє кожне правило
+        for rule in rules:
+            os_rule = rule.get('os', {})
+            matches = (os_rule.get('name', MOJANG_OS) == MOJANG_OS and
+                       not (os_rule.get('arch') == 'x86' and MOJANG_ARCH != '32'))
+            if (rule.get('action') == 'allow') != matches:
+                return False
+        return True
+    
+    def fetch_metadata(self, url: str, sha1: Optional[str], local: Path) -> Dict:
+        if local.is_file() and (sha1 is None or Hasher.file_digest(local, 'sha1') == sha1):
+            with open(local, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        r = self.session.get(url, timeout=30)
+        r.raise_for_status()
+        if sha1 and Hasher.digest(r.content, 'sha1') != sha1:
+            raise requests.RequestException(f"Контрольна сума {url} не збігається")
+        atomic_write(local, r.content)
+        return r.json()
+    
+    def vanilla_files(self, data: Dict, install_dir: Path, inherited_client: Optional[Dict] = None) -> Dict[str, Dict]:
+        # Бібліотеки, natives, client.jar, конфіг логування та об'єкти ресурсів.
+        # Записи без url, sha1 чи розміру лишаємо minecraft_launcher_lib
+        files = {}
+        
+        def add(path, download):
+            if download.get('url') and download.get('sha1') and download.get('size') is not None:
+                files[path] = {'url': download['url'], 'checksum': download['sha1'],
+                               'size': download['size'], 'algorithm': 'sha1'}
+        
+        for library in data.get('libraries', []):
+            if not self.rules_allow(library.get('rules', [])):
+                continue
+            downloads = library.get('downloads', {})
+            artifact = downloads.get('artifact', {})
+            if 'path' in artifact:
+                add(f"libraries/{artifact['path']}", artifact)
+            elif not downloads and library.get('url'):
+                # Бібліотеки лоадерів (Fabric) задані maven-ім'ям і адресою репозиторію
+                rel_path = self.maven_path(library['name'])
+                add(f"libraries/{rel_path}", {**library, 'url': f"{library['url'].rstrip('/')}/{rel_path}"})
+            classifier = library.get('natives', {}).get(MOJANG_OS)
+            if classifier:
+                native = downloads.get('classifiers', {}).get(classifier.replace('${arch}', MOJANG_ARCH), {})
+                if 'path' in native:
+                    add(f"libraries/{native['path']}", native)
+        
+        # Версія без власного client.jar отримує батьківський під своїм id, як у бібліотеці
+        client = data.get('downloads', {}).get('client') or inherited_client
+        if client:
+            add(f"versions/{data['id']}/{data['id']}.jar", client)
+        log_file = data.get('logging', {}).get('client', {}).get('file')
+        if log_file:
+            add(f"assets/log_configs/{log_file['id']}", log_file)
+        
+        asset_index = data.get('assetIndex')
+        if asset_index:
+            index = self.fetch_metadata(
+                asset_index['url'], asset_index.get('sha1'),
+                install_dir / "assets" / "indexes" / f"{data['assets']}.json"
+            )
+            for obj in index.get('objects', {}).values():
+                digest = obj['hash']
+                add(f"assets/objects/{digest[:2]}/{digest}", {
+                    'url': f"{self.assets_url}/{digest[:2]}/{digest}", 'sha1': digest, 'size': obj['size']
+                })
+        return files
+    
+    def fetch_vanilla_file(self, local: Path, info) -> bool:
+        # Наявні файли потрібного розміру не хешуємо: sha1 усіх файлів однаково
+        # перевірить minecraft_launcher_lib і сам докачає пошкоджені
+        try:
+            if not (local.is_file() and local.stat().st_size == info['size']):
+                local.parent.mkdir(parents=True, exist_ok=True)
+                self.fetch_to_file(self.session, [info['url']], local, info)
+            self.progress.add_done(info['size'])
             return True
-            
         except Exception as e:
-            ErrorHandler.show_error_dialog("Помилка встановлення", str(e))
+            self.logger.warning(f"Prefetch of {info['url']} failed, leaving it to minecraft_launcher_lib: {e}")
             return False
-
+    
+    def find_version(self, version: str) -> Optional[Dict]:
+        # Версії, що вийшла після кешування маніфесту, там ще немає — тоді перевіряємо заново
+        for ttl in (METADATA_TTL, 0):
+            versions = self.metadata.get_json(VERSION_MANIFEST_URL, ttl)
+            entry = next((v for v in versions.get('versions', []) if v['id'] == version), None)
+            if entry:
+                return entry
+        return None
+    
+    def resolve_loader_version(self, loader: str, version: str) -> Optional[str]:
+        # Те саме, що find_forge_version та get_latest_loader_version бібліотеки, але через кеш
+        if loader == "fabric":
+            return self.metadata.get_json(FABRIC_LOADERS_URL)[0]['version']
+        if loader == "forge":
+            versions = re.findall(r'<version>(.*?)</version>', self.metadata.get(FORGE_MAVEN_METADATA_URL))
+            forge_version = next((v for v in versions if v.split('-')[0] == version), None)
+            if forge_version is None:
+                raise ValueError(f"Forge для Minecraft {version} не знайдено")
+            return forge_version
+        return None
+    
+    def load_version_json(self, version_id: str, install_dir: Path) -> Optional[Dict]:
+        # Наявний version JSON читаємо з диска, ванільний якого немає — беремо з маніфесту Mojang,
+        # а версію Fabric — готовим профілем з Fabric meta, як його записав би інсталятор Fabric
+        local = install_dir / "versions" / version_id / f"{version_id}.json"
+        if local.is_file():
+            return self.fetch_metadata(None, None, local)
+        entry = self.find_version(version_id)
+        if entry is not None:
+            return self.fetch_metadata(entry['url'], entry.get('sha1'), local)
+        fabric = FABRIC_VERSION_ID.fullmatch(version_id)
+        if fabric is None:
+            return None
+        loader_version, version = fabric.groups()
+        body = self.metadata.get(FABRIC_PROFILE_URL.format(version=version, loader_version=loader_version))
+        atomic_write(local, body.encode('utf-8'))
+        return json.loads(body)
+    
+    def prefetch_vanilla(self, version: str, install_dir: Path, callback=None) -> int:
+        # Ванільні файли качаємо паралельно тим самим рушієм, що й модпак. Після цього
+        # minecraft_launcher_lib знаходить їх на місці з правильним sha1 і робить лише те,
+        # чого тут немає: розпакування natives, встановлення Java та самого лоадера.
+        # Повертає кількість файлів, які не вдалося завантажити.
+        # Версія лоадера з модпака успадковується від ванільної (inheritsFrom),
+        # тож файли збираємо з усього ланцюжка version JSON
+        chain = []
+        version_id = version
+        while version_id and version_id not in (data['id'] for data in chain):
+            data = self.load_version_json(version_id, install_dir)
+            if data is None:
+                break  # Про невідому версію повідомить сама бібліотека
+            chain.append(data)
+            version_id = data.get('inheritsFrom')
+        
+        files, client = {}, None
+        for data in reversed(chain):
+            files.update(self.vanilla_files(data, install_dir, client))
+            client = data.get('downloads', {}).get('client') or client
+        if not files:
+            return 0
+        
+        self.progress.start(sum(info['size'] for info in files.values()), callback)
+        try:
+            errors = self.run_scheduled(
+                [(info['size'], self.fetch_vanilla_file, install_dir / path, info) for path, info in files.items()],
+                callback
+            )
+        finally:
+            self.progress.stop()
+        self.logger.info(f"Prefetched {len(files) - errors} of {len(files)} files of Minecraft {version}")
+        return errors
+    
+    def share_runtime(self, instance_dir: Path) -> int:
+        # Версії та бібліотеки, що прийшли з модпаком або лишились від встановлення
+        # в папку інстансу, стають доступні у спільній папці. Жорсткі посилання
+        # місця не займають, а де їх не можна зробити — копія з правами доступу,
+        # щоб java з runtime/ лишилась виконуваною
+        runtime_dir = self.path_manager.get_runtime_dir()
+        linked = 0
+        for name in RUNTIME_DIRS:
+            if not (instance_dir / name).is_dir():
+                continue
+            snapshot = TreeSnapshot(instance_dir / name)
+            for rel_path, st in snapshot.files.items():
+                if self.partial_target(rel_path) != rel_path:
+                    continue
+                source = instance_dir / name / rel_path
+                target = runtime_dir / name / rel_path
+                try:
+                    current = target.stat()
+                    if current.st_ino == st.st_ino or (
+                            current.st_size == st.st_size and current.st_mtime_ns >= st.st_mtime_ns):
+                        continue
+                except FileNotFoundError:
+                    pass
+                target.parent.mkdir(parents=True, exist_ok=True)
+                tmp = target.with_name(target.name + PARTIAL_SUFFIX)
+                tmp.unlink(missing_ok=True)
+                try:
+                    os.link(source, tmp)
+                except OSError:
+                    shutil.copy2(source, tmp)
+                os.replace(tmp, target)
+                linked += 1
+        if linked:
+            self.logger.info(f"Shared {linked} runtime files of {instance_dir.name}")
+        return linked
+    
+    @staticmethod
+    def maven_path(name: str) -> str:
+        # group:artifact:version[:classifier][@ext] -> шлях у libraries/
+        name, _, ext = name.partition('@')
+        group, artifact, version, *classifier = name.split(':')
+        filename = '-'.join([artifact, version, *classifier]) + f".{ext or 'jar'}"
+        return f"{group.replace('.', '/')}/{artifact}/{version}/{filename}"
+    
+    def version_chain(self, version_id: str, runtime_dir: Path) -> list:
+        # version JSON лоадера і всі, від яких він успадковується, аж до ванільного
+        chain = []
+        while version_id:
+            path = runtime_dir / "versions" / version_id / f"{version_id}.json"
+            content = path.read_bytes()
+            data = json.loads(content)
+            chain.append((path, content, data))
+            version_id = data.get('inheritsFrom')
+        return chain
+    
+    def install_files(self, chain, runtime_dir: Path) -> Tuple[str, list]:
+        # Сума version JSON та списку бібліотек і файли, без яких гра не запуститься
+        digest = hashlib.sha256()
+        paths = []
+        for path, content, data in chain:
+            digest.update(content)
+            paths.append(path)
+            paths.append(runtime_dir / "versions" / data['id'] / f"{data['id']}.jar")
+            for library in data.get('libraries', []):
+                if not self.rules_allow(library.get('rules', [])):
+                    continue
+                artifact = library.get('downloads', {}).get('artifact', {})
+                rel_path = artifact.get('path') or self.maven_path(library['name'])
+                digest.update(rel_path.encode())
+                paths.append(runtime_dir / "libraries" / rel_path)
+            if 'assetIndex' in data:
+                paths.append(runtime_dir / "assets" / "indexes" / f"{data['assets']}.json")
+            java = data.get('javaVersion', {}).get('component')
+            if java:
+                executable = minecraft_launcher_lib.runtime.get_executable_path(java, str(runtime_dir))
+                paths.append(Path(executable) if executable else runtime_dir / "runtime" / java)
+        return digest.hexdigest(), [path for path in paths if path.exists()]
+    
+    def save_install_state(self, state_path: Path, loader: str, version: str,
+                           loader_version: Optional[str], version_id: str, runtime_dir: Path):
+        try:
+            digest, paths = self.install_files(self.version_chain(version_id, runtime_dir), runtime_dir)
+            state = {
+                'launcher': VERSION,
+                'loader': loader,
+                'version': version,
+                'loader_version': loader_version,
+                'version_id': version_id,
+                'digest': digest,
+                'files': {path.relative_to(runtime_dir).as_posix(): FileIndex.stat_key(path.stat())[:2]
+                          for path in paths},
+            }
+            atomic_write_json(state_path, state)
+        except Exception as e:
+            self.logger.warning(f"Failed to save install state {state_path}: {e}")
+    
+    def install_complete(self, state_path: Path, loader: str, version: str, runtime_dir: Path) -> bool:
+        # Лише stat записаних файлів і читання кількох version JSON, без мережі та хешування
+        state = self.read_partial_meta(state_path)
+        if not state or state.get('launcher') != VERSION or (state.get('loader'), state.get('version')) != (loader, version):
+            return False
+        for rel_path, (size, mtime_ns) in state.get('files', {}).items():
+            try:
+                st = os.stat(runtime_dir / rel_path)
+            except OSError:
+                return False
+            if st.st_size != size or st.st_mtime_ns != mtime_ns:
+                return False
+        try:
+            digest, _ = self.install_files(self.version_chain(state['version_id'], runtime_dir), runtime_dir)
+        except (OSError, ValueError, KeyError):
+            return False
+        return digest == state.get('digest')
+    
     def install_loader(self, loader: str, version: str, target_dir: str, callback=None) -> bool:
         try:
             install_dir = Path(target_dir)
             install_dir.mkdir(parents=True, exist_ok=True)
+            # Лоадер ставиться у спільну папку: друга інстанція тієї ж версії
+            # Minecraft докачує лише те, чого там ще немає
+            runtime_dir = self.path_manager.get_runtime_dir()
+            runtime_dir.mkdir(parents=True, exist_ok=True)
+            
+            state_path = install_dir / INSTALL_STATE_FILE
+            if self.install_complete(state_path, loader, version, runtime_dir):
+                self.logger.info(f"{loader} {version} is already installed, skipping install")
+                if callback:
+                    callback(100, '', 'complete', f"Встановлення {loader} завершено")
+                return True
+            state_path.unlink(missing_ok=True)
+            self.share_runtime(install_dir)
 
             last_percent, last_time, max_progress = -1, time.time(), [0]
             
@@ -505,15 +2595,21 @@ class ModpacksManager:
                 "setStatus": set_status
             }
             
-            if loader == "fabric":
-                minecraft_launcher_lib.fabric.install_fabric(version, str(install_dir), callback=ml_callback)
-            elif loader == "forge":
-                forge_version = minecraft_launcher_lib.forge.find_forge_version(version)
-                minecraft_launcher_lib.forge.install_forge_version(forge_version, str(install_dir), callback=ml_callback)
-            elif loader == "vanilla":
-                minecraft_launcher_lib.install.install_minecraft_version(version, str(install_dir), callback=ml_callback)
+            # Усі лоадери ставляться поверх ванільної версії, а вона — найбільша частина
+            loader_version = self.resolve_loader_version(loader, version)
+            if loader == "forge":
+                self.prefetch_vanilla(version, runtime_dir, callback)
+                minecraft_launcher_lib.forge.install_forge_version(loader_version, str(runtime_dir), callback=ml_callback)
+                version_id = minecraft_launcher_lib.forge.forge_to_installed_version(loader_version)
+            elif loader in ("fabric", "vanilla"):
+                # Версія Fabric — це профіль, що успадковується від ванільної; його бере
+                # load_version_json, тож інсталятор Fabric на Java не потрібен
+                version_id = f"fabric-loader-{loader_version}-{version}" if loader == "fabric" else version
+                self.prefetch_vanilla(version_id, runtime_dir, callback)
+                minecraft_launcher_lib.install.install_minecraft_version(version_id, str(runtime_dir), callback=ml_callback)
             else:
                 raise ValueError(f"Unknown loader: {loader}")
+            self.save_install_state(state_path, loader, version, loader_version, version_id, runtime_dir)
             
             if callback:
                 callback(100, '', 'complete', f"Встановлення {loader} завершено")
@@ -532,6 +2628,7 @@ class ModpacksManager:
 class WebSocketManager:
     def __init__(self):
         self.clients = set()
+        self.loop = None
         self.logger = logging.getLogger(__name__)
     
     async def handle_client(self, websocket):
@@ -544,35 +2641,38 @@ class WebSocketManager:
         finally:
             self.clients.discard(websocket)
     
+    async def broadcast_async(self, message: str):
+        disconnected = set()
+        for client in self.clients.copy():
+            try:
+                await client.send(message)
+            except Exception:
+                disconnected.add(client)
+        
+        self.clients -= disconnected
+    
     def broadcast(self, message: str):
-        if not self.clients:
+        if not self.clients or not self.loop:
             return
         
-        def send_to_clients():
-            try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                async def broadcast_async():
-                    if self.clients:
-                        disconnected = set()
-                        for client in self.clients.copy():
-                            try:
-                                await client.send(message)
-                            except Exception:
-                                disconnected.add(client)
-                        
-                        self.clients -= disconnected
-                
-                loop.run_until_complete(broadcast_async())
-                loop.close()
-            except Exception as e:
-                self.logger.error(f"Broadcast error: {e}")
-        
-        threading.Thread(target=send_to_clients, daemon=True).start()
+        try:
+            # Повідомлення відправляє цикл подій сервера, без окремого потоку на кожне
+            if self.in_loop():
+                self.loop.create_task(self.broadcast_async(message))
+            elif self.loop.is_running():
+                asyncio.run_coroutine_threadsafe(self.broadcast_async(message), self.loop)
+        except Exception as e:
+            self.logger.error(f"Broadcast error: {e}")
+    
+    def in_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
     
     async def start_server(self):
         try:
+            self.loop = asyncio.get_running_loop()
             server = await websockets.serve(
                 self.handle_client, "localhost", WEBSOCKET_PORT
             )
@@ -666,6 +2766,18 @@ class Application:
                             self.websocket_manager.broadcast(f"[{percent:.0f}%] {action}")
                             last_percent = percent_int
                             last_time = current_time
+                    elif status == 'progress':
+                        percent_int = int(percent)
+                        if percent_int != last_percent or current_time - last_time > 0.5:
+                            speed = message['bytes_per_second'] / (1024 * 1024)
+                            if speed >= 0.1 and message['eta'] is not None:
+                                minutes, seconds = divmod(int(message['eta']), 60)
+                                text = f"[{percent:.0f}%] Завантаження {speed:.1f} МБ/с, залишилось {minutes}:{seconds:02}"
+                            else:
+                                text = f"[{percent:.0f}%] Перевірка файлів"
+                            self.websocket_manager.broadcast(text)
+                            last_percent = percent_int
+                            last_time = current_time
                     elif status == 'complete':
                         self.websocket_manager.broadcast(message)
                     elif status == 'error':
@@ -677,14 +2789,26 @@ class Application:
                         
                         install_dir = self.path_manager.get_install_dir(config.loader)
                         
+                        self.modpacks_manager.engine = config.engine
+                        self.modpacks_manager.limiter.configure(config.download_limit * 125000)
                         if self.modpacks_manager.check_modpack_exists(config.loader):
-                            install_success = self.modpacks_manager.install_modpack(
+                            report = self.modpacks_manager.install_modpack(
                                 config.loader, install_dir, progress_callback
                             )
+                            if not report:
+                                # Один звіт на всю синхронізацію замість діалогу на кожен файл
+                                self.websocket_manager.broadcast(
+                                    f"Помилка встановлення гри: не завантажено {len(report.failures)} файлів"
+                                    if report.failures else "Помилка встановлення гри"
+                                )
+                                ErrorHandler.show_error_dialog("Помилка встановлення", report.summary())
+                                return
+                            self.modpacks_manager.share_runtime(install_dir)
+                            install_success = True
                             error_msg = "Помилка встановлення гри"
                         else:
                             install_success = self.modpacks_manager.install_loader(
-                                "vanilla", config.loader, self.websocket_manager.broadcast
+                                "vanilla", config.loader, install_dir, progress_callback
                             )
                             error_msg = "Помилка встановлення гри"
                         
@@ -717,6 +2841,20 @@ class Application:
                 )
                 return jsonify({"success": False, "error": str(e)})
         
+        @self.app.route('/plan')
+        def sync_plan():
+            try:
+                loader = request.args.get('loader', '')
+                if not re.fullmatch(r'[\w.-]+', loader):
+                    return jsonify({"success": False, "error": "Невірні дані"})
+                
+                install_dir = self.path_manager.get_install_dir(loader)
+                plan = self.modpacks_manager.prepare_plan(loader, install_dir)
+                return jsonify({"success": not plan.error, **plan.summary()})
+            except Exception as e:
+                self.logger.error(f"Sync plan error: {e}")
+                return jsonify({"success": False, "error": str(e)})
+        
         @self.app.route('/static/<filename>')
         def static_files(filename):
             return send_from_directory('static', filename)
@@ -912,6 +3050,7 @@ class Application:
         try:
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
+            self.modpacks_manager.loop = loop
             loop.run_until_complete(self.websocket_manager.start_server())
         except Exception as e:
             ErrorHandler.show_error_dialog(
@@ -923,6 +3062,9 @@ class Application:
         try:
             threading.Thread(target=self.run_flask, daemon=True).start()
             threading.Thread(target=self.run_websocket, daemon=True).start()
+            threading.Thread(
+                target=self.modpacks_manager.mirrors.probe, args=(self.modpacks_manager.session,), daemon=True
+            ).start()
             self.window = webview.create_window(
                 f"QQQ - Час стати легендою! (BETA ВЕРСІЯ {VERSION})",
                 f"http://127.0.0.1:{FLASK_PORT}/",